@@ -0,0 +1,177 @@
+"""Loads, scales and converts the game's sprites
+
+Sprites are registered by name with the size and rotation the game draws
+them at, and loaded on the first get() of that name. A loaded sprite
+comes from a pre-scaled copy in the on-disk cache when one matches the
+hash of the source file and the target size; otherwise the source image
+is decoded, scaled, rotated and written to the cache. Sprites are then
+converted to the display's pixel format, so blitting them costs no
+per-pixel format conversion.
+"""
+import hashlib
+import io
+import os
+import time
+
+import pygame
+
+IMAGE_DIR = "images"
+CACHE_DIR = ".asset_cache"
+
+
+class AssetManager(object):
+    """Lazily loads sprites by name
+
+    Attributes:
+        root: Directory the registered paths are relative to
+        cache_dir: Directory of the pre-scaled sprite cache, or None to
+            always load from the source images
+        timings: Dict mapping each loaded name to a tuple (seconds,
+            "cache" or "source")
+    """
+
+    def __init__(self, root=IMAGE_DIR, cache_dir=CACHE_DIR):
+        """Inits AssetManager"""
+        self.root = root
+        self.cache_dir = cache_dir
+        self.timings = {}
+        self._specs = {}
+        self._loaded = {}
+
+    def register(self, name, path, size=None, angle=0):
+        """Registers a sprite
+
+        Args:
+            name: Name the sprite is looked up by
+            path: Image file, relative to root
+            size: (width, height) to scale to, or None to keep the size
+            angle: Degrees to rotate by after scaling
+        """
+        self._specs[name] = (path, size, angle)
+        self._loaded.pop(name, None)
+
+    def get(self, name):
+        """Returns the sprite registered as name, loading it if needed"""
+        surf = self._loaded.get(name)
+        if surf is None:
+            if name not in self._specs:
+                raise KeyError("Unknown asset: " + name)
+            surf = self._loaded[name] = self._load(name)
+        return surf
+
+    def _cache_path(self, path, data, size, angle):
+        """Returns the cache file for a source and target, or None"""
+        if self.cache_dir is None or (size is None and not angle):
+            return None  # Nothing to pre-compute
+        digest = hashlib.sha1(data).hexdigest()[:16]
+        w, h = size or (0, 0)
+        base = os.path.splitext(path)[0].replace("/", "_")
+        return os.path.join(self.cache_dir, "%s-%s-%dx%d-r%d.png" %
+                            (base, digest, w, h, angle))
+
+    def _load(self, name):
+        """Loads, transforms and converts one sprite"""
+        path, size, angle = self._specs[name]
+        start = time.perf_counter()
+        with open(os.path.join(self.root, path), 'rb') as f:
+            data = f.read()
+        cached = self._cache_path(path, data, size, angle)
+
+        surf = None
+        source = "cache"
+        if cached and os.path.exists(cached):
+            try:
+                surf = pygame.image.load(cached)
+            except pygame.error:
+                surf = None
+        if surf is None:
+            source = "source"
+            surf = self._transform(pygame.image.load(io.BytesIO(data), path),
+                                   size, angle)
+            if cached:
+                try:
+                    if not os.path.isdir(self.cache_dir):
+                        os.makedirs(self.cache_dir)
+                    pygame.image.save(surf, cached)
+                except (OSError, pygame.error):
+                    pass  # Run without the cache
+
+        if pygame.display.get_surface() is not None:
+            if surf.get_flags() & pygame.SRCALPHA:
+                surf = surf.convert_alpha()
+            else:
+                surf = surf.convert()
+        self.timings[name] = (time.perf_counter() - start, source)
+        return surf
+
+    @staticmethod
+    def _transform(surf, size, angle):
+        """Scales and rotates a freshly decoded image"""
+        if size is not None:
+            surf = pygame.transform.scale(surf, size)
+        if angle:
+            surf = pygame.transform.rotate(surf, angle)
+        if surf.get_colorkey() is not None:
+            # Turn the color key into per-pixel alpha, which survives
+            # being saved to the cache
+            keyed = surf
+            surf = pygame.Surface(keyed.get_size(), pygame.SRCALPHA)
+            surf.blit(keyed, (0, 0))
+        return surf
+
+    def atlas(self, names, width=256):
+        """Packs the named sprites into a SpriteAtlas"""
+        return SpriteAtlas([(name, self.get(name)) for name in names], width)
+
+    def format_timings(self):
+        """Returns the load time of every loaded sprite as a table"""
+        lines = []
+        total = 0.0
+        for name in sorted(self.timings):
+            seconds, source = self.timings[name]
+            total += seconds
+            lines.append("%-12s %8.2f ms  %s" % (name, seconds * 1000, source))
+        lines.append("%-12s %8.2f ms" % ("total", total * 1000))
+        return "\n".join(lines)
+
+
+class SpriteAtlas(object):
+    """Sprites packed onto one surface
+
+    Drawing from a single surface by source rect lets a whole layer of
+    sprites be submitted with one Surface.blits call.
+
+    Attributes:
+        surface: The atlas
+        rects: Dict mapping each sprite name to its area of surface
+    """
+
+    def __init__(self, sprites, width=256):
+        """Inits SpriteAtlas
+
+        Args:
+            sprites: List of (name, Surface) pairs
+            width: Width of the atlas; rows of sprites wrap at it
+        """
+        width = max([width] + [s.get_width() for _, s in sprites])
+
+        # Pack the sprites onto shelves, tallest first
+        self.rects = {}
+        x = y = shelf = 0
+        for name, surf in sorted(sprites, key=lambda s: -s[1].get_height()):
+            w, h = surf.get_size()
+            if x + w > width:
+                x = 0
+                y += shelf
+                shelf = 0
+            self.rects[name] = pygame.Rect(x, y, w, h)
+            x += w
+            shelf = max(shelf, h)
+
+        self.surface = pygame.Surface((width, y + shelf), pygame.SRCALPHA)
+        for name, surf in sprites:
+            # Copy, don't blend, each sprite onto the transparent atlas
+            self.surface.blit(surf, self.rects[name],
+                              special_flags=pygame.BLEND_RGBA_MAX)
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert_alpha()
@@ -1,20 +1,38 @@
-import random
+import argparse
+import os
 import sys
+import time
 
+import numpy as np
 import pygame
 from pygame.locals import *
 
+import textcache
+from assets import AssetManager
+from audit import LifecycleAuditor
+from effects import ExplosionFrames, EffectLayer
+from particles import PARTICLE_BUDGET, ParticleSystem
+from profiler import FrameProfiler, ProfileOverlay
+from render import DirtyRenderer
+from replay import ReplayRecorder
+from starfield import Starfield
+from textcache import GlyphAtlas
+from tracer import TraceWriter
+from transitions import Transition
+from widgets import Widget, Label, Button, Panel
+from world import (WIDTH, HEIGHT, TICK_MS, ASTEROID_EXPLODE_TIME, INPUT_LEFT,
+                   INPUT_RIGHT, INPUT_FIRE, INPUT_ESCAPE, NUM_ASTEROID_SPRITES,
+                   World, FixedStepper)
+
 # Define Constants
-WIDTH = 375
-HEIGHT = 600
 FPS = 30
-PLAYER_MOVE_SPEED = 15
-ASTEROID_MAX_X = 5
-ASTEROID_MAX_Y = 8
-ASTEROID_MIN_Y = 2
-
-# Create lists to store sprites
-ASTEROID_SPRITES = []
+DEBRIS_PER_HIT = 40  # Particles thrown off by an exploding asteroid
+EXHAUST_RATE = 600  # Engine trail particles per second
+SCORES_FILE = "user_scores.txt"
+DEBRIS_RAMP = ((255, 255, 255), (255, 220, 150), (255, 160, 60),
+               (200, 90, 30), (120, 50, 20), (60, 30, 20))
+EXHAUST_RAMP = ((255, 255, 200), (255, 230, 120), (255, 170, 60),
+                (230, 100, 30), (160, 50, 20), (80, 30, 20))
 
 # Initialize Pygame and fpsClock
 pygame.init()
@@ -23,56 +41,134 @@ pygame.display.set_caption("Meteor Storm - by Drew Wagner")
 fpsClock = pygame.time.Clock()
 
 
-# Loads and transforms asteroid sprites
-def load_asteroids(num):
-    """ Loads and transforms asteroid sprites
-
-    Loads images from /images/asteroids/
-
-    Args:
-        num: An integer indicating how many sprites to load.
-    """
-    for i in range(num):
-        try:
-            s = pygame.image.load('images/asteroids/asteroid' + str(i + 1) + '.png')
-        except pygame.error:
-            if ASTEROID_SPRITES:
-                break
-            else:
-                raise Exception("Could not load asteroid sprites.")
-        else:
-            s = pygame.transform.scale(s, (25, 25))
-            ASTEROID_SPRITES.append(s)
-
-
 # Load fonts
 FONT_S = pygame.font.SysFont("Impact", 20)
 FONT_M = pygame.font.SysFont("Impact", 28)
 FONT_L = pygame.font.SysFont("Impact", 46)
 FONT_XL = pygame.font.SysFont("Impact", 66)
+FONT_MONO_S = pygame.font.SysFont("Courier", 12)
 FONT_MONO_M = pygame.font.SysFont("Courier", 28)
 
-# Load background sprite - Image credit: GameArtGuppy.com
-backgroundObj = pygame.image.load('images/space.png')
+# Digits of the in-game score
+SCORE_DIGITS = GlyphAtlas(FONT_M)
 
-# Load and transform player sprites
+# Register sprites at the size they are drawn at
+assets = AssetManager()
+# Image credit: GameArtGuppy.com
+assets.register("background", "space.png")
 # Image credit: simeontemplar.deviantart.com
-playerSprite1 = pygame.image.load('images/spaceship/spaceship_1.gif')
-playerSprite1 = pygame.transform.scale(playerSprite1, (75, 75))
-playerSprite2 = pygame.image.load('images/spaceship/spaceship_2.gif')
-playerSprite2 = pygame.transform.scale(playerSprite2, (75, 75))
+assets.register("player1", "spaceship/spaceship_1.gif", (75, 75))
+assets.register("player2", "spaceship/spaceship_2.gif", (75, 75))
+assets.register("bolt", "bolt.png", (50, 33), 90)
+assets.register("heart", "heart.png", (28, 28))
+ASTEROID_NAMES = ["asteroid" + str(i + 1)
+                  for i in range(NUM_ASTEROID_SPRITES)]
+for name in ASTEROID_NAMES:
+    assets.register(name, "asteroids/" + name + ".png", (25, 25))
+
+backgroundObj = assets.get("background")
+
+# Gameplay sprites are drawn from one atlas, a layer per blits call
+SPRITES = assets.atlas(["player1", "player2", "bolt", "heart"] +
+                       ASTEROID_NAMES)
+ATLAS = SPRITES.surface
+PLAYER_AREAS = (SPRITES.rects["player1"], SPRITES.rects["player2"])
+BOLT_AREA = SPRITES.rects["bolt"]
+HEART_AREA = SPRITES.rects["heart"]
+ASTEROID_AREAS = [SPRITES.rects[name] for name in ASTEROID_NAMES]
+
+# Explosions, rendered once and played back by age
+ASTEROID_EXPLOSIONS = EffectLayer(
+    ExplosionFrames((255, 255, 255), ASTEROID_EXPLODE_TIME // 2,
+                    ASTEROID_EXPLODE_TIME))
+PLAYER_EXPLOSION = ExplosionFrames((255, 127, 31), 75, 150, count=38,
+                                   falloff=True)
+
+
+def draw_player(player, x, time):
+    """Draws Player sprite animation
+
+    Args:
+        player: The Player to draw
+        x: Left coordinate to draw at
+        time: World time driving the animation
+
+    Returns:
+        The Rect drawn to.
+    """
+    r = (x, player.rect.top - 25)
+    if time % 200 < 100:
+        return screen.blit(ATLAS, r, PLAYER_AREAS[0])
+    else:
+        return screen.blit(ATLAS, r, PLAYER_AREAS[1])
+
+
+def draw_asteroids(xs, ys, sprites, ages=None):
+    """Draws asteroid sprites and, iff exploding, their explosions
+
+    Args:
+        xs, ys: Top-left corners of the asteroids
+        sprites: Sprite index of each asteroid
+        ages: Milliseconds since each explosion started, negative for
+            asteroids that are not exploding, or None if none are
+
+    Returns:
+        A list of the Rects drawn to.
+    """
+    areas = ASTEROID_AREAS
+    k = len(areas)
+    rects = screen.blits([(ATLAS, xy, areas[sprite % k])
+                          for xy, sprite in zip(zip(xs, ys), sprites)])
+
+    # Explosions over the asteroids
+    if ages is not None:
+        centers = []
+        exploding = []
+        for x, y, age in zip(xs, ys, ages):
+            if age >= 0:
+                centers.append((x + 12, y + 12))
+                exploding.append(age)
+        rects += ASTEROID_EXPLOSIONS.draw(screen, centers, exploding)
+    return rects
 
-# Load and transform bolt sprites
-boltSprite1 = pygame.image.load('images/bolt.png')
-boltSprite1 = pygame.transform.scale(boltSprite1, (50, 33))
-boltSprite1 = pygame.transform.rotate(boltSprite1, 90)
 
-# Load and transform heart
-heartSprite = pygame.image.load('images/heart.png')
-heartSprite = pygame.transform.scale(heartSprite, (28, 28))
+def draw_world(world, alpha=1.0):
+    """Draws the entities of a World
 
-# Load and transform asteroid sprites
-load_asteroids(4)
+    Order is important for layering! Each layer is one blits call from
+    the sprite atlas.
+
+    Args:
+        world: The World to draw
+        alpha: How far to interpolate between the previous and the
+            current tick (0 to 1)
+
+    Returns:
+        A list of the Rects drawn to.
+    """
+    # World time at the drawn instant
+    time = world.time - (1.0 - alpha) * TICK_MS
+    rects = []
+
+    bx, by = world.bolts.lerp(alpha)
+    rects += screen.blits([(ATLAS, xy, BOLT_AREA)
+                           for xy in zip(bx.tolist(), by.tolist())])
+
+    roids = world.roids
+    n = roids.count
+    rx, ry = roids.lerp(alpha)
+    explode = roids.explode[:n]
+    ages = None
+    if (explode >= 0).any():
+        ages = np.where(explode >= 0, np.maximum(time - explode, 0), -1)
+        ages = ages.tolist()
+    rects += draw_asteroids(rx.tolist(), ry.tolist(),
+                            roids.sprite[:n].tolist(), ages)
+
+    player = world.player
+    px = int(player.prev_x + (player.rect.x - player.prev_x) * alpha)
+    rects.append(draw_player(player, px, time))
+    return rects
 
 
 class OpeningState(object):
@@ -97,27 +193,15 @@ class OpeningState(object):
         self.timer = False
         self.prev = None
 
-    # noinspection PyMethodMayBeStatic
+        # Title fades in from black while zooming in
+        self.title = textcache.render(FONT_L, "METEOR STORM")
+        self.title_in = Transition(500, scale=(0.0, 1.0), alpha=(0, 255))
+        self.title_in.bake(self.title)
+
     def draw(self, dt):
         """Draws the opening animation"""
-        # Begin drawing animation
         screen.fill((0, 0, 0))
-        gray = min(max(0, int(255 * dt / 500)), 255)
-        lbl_meteorstorm = FONT_L.render("METEOR STORM", True,
-                                        (gray, gray, gray))
-
-        # Opening fade-in animation
-        if dt < 500:
-            lbl_meteorstorm = pygame.transform.rotozoom(
-                lbl_meteorstorm, 0, dt / 500)
-            rect_meteorstorm = lbl_meteorstorm.get_rect()
-            rect_meteorstorm.center = (187, 300)
-            screen.blit(lbl_meteorstorm, rect_meteorstorm)
-        # Fade-in complete
-        else:
-            rect_meteorstorm = lbl_meteorstorm.get_rect()
-            rect_meteorstorm.center = (187, 300)
-            screen.blit(lbl_meteorstorm, rect_meteorstorm)
+        self.title_in.draw(screen, self.title, dt, center=(187, 300))
 
     def enter(self, prev):
         """Executed on entering the state
@@ -188,125 +272,32 @@ class MainMenuState(object):
         self.timer = False
         self.prev = None
 
-    # noinspection PyMethodMayBeStatic
-    def black(self):
-        """Returns Overlay from opening scene for fade-out"""
-        black = pygame.Surface((WIDTH, HEIGHT))
-        black.fill((0, 0, 0))
-
-        return black.convert()
-
-    def draw(self, btn_p=False, btn_ins=False, btn_l=False, btn_q=False):
-        """Draws the menu
-
-        Args:
-            btn_p: Flag for play button mouseover
-            btn_ins: Flag for instructions button mouseover
-            btn_l: Flag for leader board button mouseover
-            btn_q: Flag for quit button mouseover
-        """
-        # Draw background
-        screen.blit(backgroundObj, (0, 0))
+        # Build the menu once, buttons are redrawn only on mouseover
+        self.menu = Panel((WIDTH, HEIGHT), background=backgroundObj,
+                          topleft=(0, 0))
+        self.menu.add(Label("METEOR", FONT_XL, center=(187, 90)))
+        self.menu.add(Label("STORM", FONT_XL, center=(187, 150)))
+        self.btn_play = self.menu.add(
+            Button("PLAY", FONT_M, (300, 50), 2, 6, center=self._PLAY))
+        self.btn_inst = self.menu.add(
+            Button("INSTRUCTIONS", FONT_M, (300, 50), 2, 6, center=self._INST))
+        self.btn_lead = self.menu.add(
+            Button("LEADER BOARD", FONT_M, (300, 50), 2, 6, center=self._LEAD))
+        self.btn_quit = self.menu.add(
+            Button("QUIT", FONT_M, (300, 50), 2, 6, center=self._QUIT))
+        self.menu.add(Label("Created by Drew Wagner", FONT_S,
+                            midbottom=(187, 600)))
+
+        # Overlay from opening scene for fade-out
+        self.black = pygame.Surface((WIDTH, HEIGHT))
+        self.black.fill((0, 0, 0))
+        self.black = self.black.convert()
+        self.fade_in = Transition(255, alpha=(255, 0))
+        self.fade_in.bake(self.black)
 
-        # Draw Title
-        lbl_title_line_1 = FONT_XL.render("METEOR", True,
-                                          (255, 255, 255))
-        rect_title_line_1 = lbl_title_line_1.get_rect()
-        rect_title_line_1.center = (187, 90)
-        screen.blit(lbl_title_line_1, rect_title_line_1)
-        lbl_title_line_2 = FONT_XL.render("STORM", True,
-                                          (255, 255, 255))
-        rect_title_line_2 = lbl_title_line_2.get_rect()
-        rect_title_line_2.center = (187, 150)
-        screen.blit(lbl_title_line_2, rect_title_line_2)
-
-        # Draw Play button
-        btn_play = pygame.Surface((300, 50))
-        if btn_p:
-            btn_play.fill((0, 0, 0))
-            pygame.draw.rect(btn_play, (65, 65, 65), (6, 6, 288, 38), 2)
-            lbl_play = FONT_M.render("PLAY", True,
-                                     (255, 255, 255))
-        else:
-            btn_play.fill((255, 255, 255))
-            pygame.draw.rect(btn_play, (190, 190, 190), (6, 6, 288, 38), 2)
-            lbl_play = FONT_M.render("PLAY", True,
-                                     (0, 0, 0))
-        rect_lbl_play = lbl_play.get_rect()
-        rect_lbl_play.center = btn_play.get_rect().center
-        btn_play.blit(lbl_play, rect_lbl_play)
-
-        rect_play = btn_play.get_rect()
-        rect_play.center = self._PLAY
-        screen.blit(btn_play, rect_play)
-
-        # Draw Instructions button
-        btn_instructions = pygame.Surface((300, 50))
-
-        if btn_ins:
-            btn_instructions.fill((0, 0, 0))
-            pygame.draw.rect(btn_instructions, (65, 65, 65), (6, 6, 288, 38), 2)
-            lbl_instructions = FONT_M.render("INSTRUCTIONS", True,
-                                             (255, 255, 255))
-        else:
-            btn_instructions.fill((255, 255, 255))
-            pygame.draw.rect(btn_instructions, (190, 190, 190), (6, 6, 288, 38), 2)
-            lbl_instructions = FONT_M.render("INSTRUCTIONS", True,
-                                             (0, 0, 0))
-        rect_lbl_inst = lbl_instructions.get_rect()
-        rect_lbl_inst.center = btn_instructions.get_rect().center
-        btn_instructions.blit(lbl_instructions, rect_lbl_inst)
-
-        rect_instructions = btn_instructions.get_rect()
-        rect_instructions.center = self._INST
-        screen.blit(btn_instructions, rect_instructions)
-
-        # Draw Leaderboard button
-        btn_lead = pygame.Surface((300, 50))
-        if btn_l:
-            btn_lead.fill((0, 0, 0))
-            pygame.draw.rect(btn_lead, (65, 65, 65), (6, 6, 288, 38), 2)
-            lbl_lead = FONT_M.render("LEADER BOARD", True,
-                                     (255, 255, 255))
-        else:
-            btn_lead.fill((255, 255, 255))
-            pygame.draw.rect(btn_lead, (190, 190, 190), (6, 6, 288, 38), 2)
-            lbl_lead = FONT_M.render("LEADER BOARD", True,
-                                     (0, 0, 0))
-        rect_lbl_lead = lbl_lead.get_rect()
-        rect_lbl_lead.center = btn_lead.get_rect().center
-        btn_lead.blit(lbl_lead, rect_lbl_lead)
-
-        rect_lead = btn_lead.get_rect()
-        rect_lead.center = self._LEAD
-        screen.blit(btn_lead, rect_lead)
-
-        # Draw QUIT button
-        btn_quit = pygame.Surface((300, 50))
-        if btn_q:
-            btn_quit.fill((0, 0, 0))
-            pygame.draw.rect(btn_quit, (65, 65, 65), (6, 6, 288, 38), 2)
-            lbl_quit = FONT_M.render("QUIT", True,
-                                     (255, 255, 255))
-        else:
-            btn_quit.fill((255, 255, 255))
-            pygame.draw.rect(btn_quit, (190, 190, 190), (6, 6, 288, 38), 2)
-            lbl_quit = FONT_M.render("QUIT", True,
-                                     (0, 0, 0))
-        rect_lbl_quit = lbl_quit.get_rect()
-        rect_lbl_quit.center = btn_quit.get_rect().center
-        btn_quit.blit(lbl_quit, rect_lbl_quit)
-
-        rect_quit = btn_quit.get_rect()
-        rect_quit.center = self._QUIT
-        screen.blit(btn_quit, rect_quit)
-
-        # Draw Signature
-        lbl_sig = FONT_S.render("Created by Drew Wagner", True, (255, 255, 255))
-        rect_sig = lbl_sig.get_rect()
-        rect_sig.bottom = 600
-        rect_sig.centerx = 187
-        screen.blit(lbl_sig, rect_sig)
+    def draw(self):
+        """Draws the menu"""
+        screen.blit(self.menu.image, self.menu.rect)
 
     def enter(self, prev):
         """Executed on entering state
@@ -320,11 +311,9 @@ class MainMenuState(object):
         dt = float(pygame.time.get_ticks() - self.timer)
 
         # Begin drawing fade-in animation
+        self.menu.update(None)
         self.draw()
-        black = self.black()
-        black.set_alpha(int(max(255 - dt, 0)))
-
-        screen.blit(black, (0, 0))
+        self.fade_in.draw(screen, self.black, dt, topleft=(0, 0))
 
         # Animation is finished
         if dt > 1000:
@@ -334,38 +323,23 @@ class MainMenuState(object):
     def update(self):
         """State update"""
         if self.active:
-            # Set Rects for buttons and test for mouseover
-            btn_play_rect = pygame.Rect((0, 0), (300, 50))
-            btn_play_rect.center = self._PLAY
-            btn_play_active = btn_play_rect.collidepoint(pygame.mouse.get_pos())
-
-            btn_inst_rect = pygame.Rect((0, 0), (300, 50))
-            btn_inst_rect.center = self._INST
-            btn_inst_active = btn_inst_rect.collidepoint(pygame.mouse.get_pos())
-
-            btn_lead_rect = pygame.Rect((0, 0), (300, 50))
-            btn_lead_rect.center = self._LEAD
-            btn_lead_active = btn_lead_rect.collidepoint(pygame.mouse.get_pos())
-
-            btn_quit_rect = pygame.Rect((0, 0), (300, 50))
-            btn_quit_rect.center = self._QUIT
-            btn_quit_active = btn_quit_rect.collidepoint(pygame.mouse.get_pos())
+            # Test for mouseover
+            hovered = self.menu.update(self.master.mouse.get_pos())
 
             # Check for mouse click and go to appropriate states
-            flag = pygame.mouse.get_pressed()[0]
+            flag = self.master.mouse.get_pressed()[0]
             if flag:
-                if btn_play_active:
+                if hovered is self.btn_play:
                     self.master.goto(self.master.playingstate)
-                elif btn_inst_active:
+                elif hovered is self.btn_inst:
                     pass
-                elif btn_lead_active:
+                elif hovered is self.btn_lead:
                     self.master.goto(self.master.leaderboardstate)
-                elif btn_quit_active:
+                elif hovered is self.btn_quit:
                     # TODO goto quit state once QuitState is implemented
-                    pygame.quit()
-                    sys.exit()
+                    self.master.shutdown()
 
-            self.draw(btn_play_active, btn_inst_active, btn_lead_active, btn_quit_active)
+            self.draw()
         else:
             self.enter(self.prev)  # State entry is not complete
 
@@ -402,124 +376,117 @@ class GameOverState(object):
         self.timer = False
         self.prev = None
 
-    def get_panel(self, btn_res=False, btn_ss=False, new_high=False):
+        self.panel = Panel((300, 200), border=((65, 65, 65), 5),
+                           center=(187, 300))
+        self.lbl_gameover = self.panel.add(Label("GAME OVER", FONT_M))
+        self.lbl_score = self.panel.add(Label("", FONT_S))
+        self.lbl_highscore = self.panel.add(Label("", FONT_S))
+        self.btn_restart = self.panel.add(
+            Button("RESTART", FONT_S, (115, 30), center=(150, 110)))
+        self.btn_save = self.panel.add(
+            Button("SAVE SCORE", FONT_S, (115, 30), center=(150, 145)))
+        self._panel_key = None
+        # The zoom is baked from the panel without its scores, which
+        # change every game, once per layout of the title. The scores
+        # get zooms of their own, baked whenever their text changed.
+        self._frames = {}
+        self.zoom_in = {False: Transition(500, scale=(0.0, 1.0)),
+                        True: Transition(500, scale=(0.0, 1.0))}
+        self.zoom_scores = dict(
+            (lbl, Transition(500, scale=(0.0, 1.0)))
+            for lbl in (self.lbl_score, self.lbl_highscore))
+
+        # Whole screen, so a static frame costs a single blit
+        self.view = Panel((WIDTH, HEIGHT), background=backgroundObj,
+                          topleft=(0, 0))
+        self.view.add(self.panel)
+
+    def get_panel(self, new_high=False):
         """Returns the surface for the gameover panel.
 
+        The labels are only updated when the score, the highscore or
+        new_high changed.
+
         Args:
-            btn_res: Flag for resume button mouseover.
-            btn_ss: Flag for save button mouseover.
             new_high: Flag for if score is a new highscore.
         """
-        # Set the y coordinates for the title and highscore labels
-        if new_high:
-            _gameovery = 50
-            _highscorey = 75
-        else:
-            _gameovery = 30
-            _highscorey = 79
-
-        # Create panel surface
-        panel = pygame.Surface((300, 200))
-        panel.fill((127, 127, 127))
-        pygame.draw.rect(panel, (65, 65, 65), panel.get_rect(), 5)
-
-        lbl_gameover = FONT_M.render("GAME OVER", True,
-                                     (255, 255, 255))
-        rect_gameover = lbl_gameover.get_rect()
-        rect_gameover.center = (150, _gameovery)
-        panel.blit(lbl_gameover, rect_gameover)
+        key = (new_high, self.master.points, self.master.highscore)
+        if key == self._panel_key:
+            return self.panel.image
+        self._panel_key = key
 
-        # Display score and/or (new) highscore
+        # Set the title and highscore labels
         if new_high:
-            lbl_highscore = FONT_S.render("NEW HIGHSCORE: " + str(self.master.points), True,
-                                          (255, 255, 255))
+            self.lbl_gameover.place(center=(150, 50))
+            self.lbl_highscore.set_text("NEW HIGHSCORE: " + str(self.master.points))
+            self.lbl_highscore.place(center=(150, 75))
+            self.lbl_score.show(False)
         else:
-            lbl_highscore = FONT_S.render("HIGHSCORE: " + str(self.master.highscore), True,
-                                          (255, 255, 255))
-            lbl_score = FONT_S.render("SCORE: " + str(self.master.points), True,
-                                      (255, 255, 255))
-            rect_score = lbl_score.get_rect()
-            rect_score.center = (150, 59)
-            panel.blit(lbl_score, rect_score)
-        rect_highscore = lbl_highscore.get_rect()
-        rect_highscore.center = (150, _highscorey)
-        panel.blit(lbl_highscore, rect_highscore)
-
-        # Draw Restart button
-        btn_restart = pygame.Surface((115, 30))
-        if btn_res:
-            btn_restart.fill((0, 0, 0))
-            pygame.draw.rect(btn_restart, (65, 65, 65), (3, 3, 109, 24), 1)
-            lbl_restart = FONT_S.render("RESTART", True,
-                                        (255, 255, 255))
-        else:
-            btn_restart.fill((255, 255, 255))
-            pygame.draw.rect(btn_restart, (190, 190, 190), (3, 3, 109, 24), 1)
-            lbl_restart = FONT_S.render("RESTART", True,
-                                        (0, 0, 0))
-
-        rect_lbl_restart = lbl_restart.get_rect()
-        rect_lbl_restart.center = btn_restart.get_rect().center
-        btn_restart.blit(lbl_restart, rect_lbl_restart)
-
-        rect_restart = btn_restart.get_rect()
-        rect_restart.center = (150, 110)
-        panel.blit(btn_restart, rect_restart)
-
-        # Draw Save button
-        btn_save = pygame.Surface((115, 30))
-        if btn_ss:
-            btn_save.fill((0, 0, 0))
-            pygame.draw.rect(btn_save, (65, 65, 65), (3, 3, 109, 24), 1)
-            lbl_save = FONT_S.render("SAVE SCORE", True,
-                                     (255, 255, 255))
-        else:
-            btn_save.fill((255, 255, 255))
-            pygame.draw.rect(btn_save, (190, 190, 190), (3, 3, 109, 24), 1)
-            lbl_save = FONT_S.render("SAVE SCORE", True,
-                                     (0, 0, 0))
+            self.lbl_gameover.place(center=(150, 30))
+            self.lbl_highscore.set_text("HIGHSCORE: " + str(self.master.highscore))
+            self.lbl_highscore.place(center=(150, 79))
+            self.lbl_score.set_text("SCORE: " + str(self.master.points))
+            self.lbl_score.place(center=(150, 59))
+            self.lbl_score.show(True)
+
+        return self.panel.image
 
-        rect_lbl_save = lbl_save.get_rect()
-        rect_lbl_save.center = btn_save.get_rect().center
-        btn_save.blit(lbl_save, rect_lbl_save)
+    def get_frame(self, new_high=False):
+        """Returns the gameover panel without its scores
 
-        rect_save = btn_save.get_rect()
-        rect_save.center = (150, 145)
-        panel.blit(btn_save, rect_save)
+        The same surface is returned every game with the same layout, so
+        its zoom is only baked once.
 
-        # Convert panel to more efficient surface and return
-        return panel.convert()
+        Args:
+            new_high: Flag for if score is a new highscore.
+        """
+        frame = self._frames.get(new_high)
+        if frame is None:
+            self.get_panel(new_high)
+            shown = self.lbl_score.visible
+            self.lbl_score.show(False)
+            self.lbl_highscore.show(False)
+            frame = self._frames[new_high] = self.panel.image.copy()
+            self.lbl_score.show(shown)
+            self.lbl_highscore.show(True)
+        return frame
 
     def draw_entry(self, dt):
         """Draws entry animation"""
         screen.blit(backgroundObj, (0, 0))
 
         # Explode remaining asteroids and player
-        for a in self.master.roids:
-            if not a.explode:
-                a.explode = self.timer
-            a.vely = 20
-            a.draw()
+        if dt > ASTEROID_EXPLODE_TIME:
+            self.master.world.clear_asteroids()
+        roids = self.master.roids
+        n = roids.count
+        draw_asteroids(roids.x[:n].tolist(), roids.y[:n].tolist(),
+                       roids.sprite[:n].tolist(), [dt] * n)
         if self.prev is not self.master.leaderboardstate:
-            if not self.master.player.explode:
-                self.master.player.explode = self.timer
-            self.master.player.draw()
+            if dt < 150:
+                boom = PLAYER_EXPLOSION.frame(dt)
+                screen.blit(boom, boom.get_rect(
+                    center=self.master.player.rect.center))
 
         # Do animation
         if self.master.points > self.master.highscore:
             new_high = True
         else:
             new_high = False
-        panel = self.get_panel(new_high=new_high)
-        if dt < 500:
-            panel = pygame.transform.rotozoom(panel, 0, dt / 500)
-            panel_rect = panel.get_rect()
-            panel_rect.center = (187, 100 + 200 * dt / 500)
-            screen.blit(panel, panel_rect)
-        else:
-            panel_rect = panel.get_rect()
-            panel_rect.center = (187, 300)
-            screen.blit(panel, panel_rect)
+        self.view.update(None)
+        self.get_panel(new_high=new_high)
+        center = (187, 100 + 200 * min(dt, 500) / 500)
+        zoom = self.zoom_in[new_high]
+        zoom.draw(screen, self.get_frame(new_high), dt, center=center)
+
+        # Zoom the scores over the baked frame
+        scale = zoom.values(dt)[0]
+        middle = self.panel.rect.w / 2.0, self.panel.rect.h / 2.0
+        for lbl, label_zoom in self.zoom_scores.items():
+            if lbl.visible:
+                label_zoom.draw(screen, lbl.image, dt, center=(
+                    center[0] + (lbl.rect.centerx - middle[0]) * scale,
+                    center[1] + (lbl.rect.centery - middle[1]) * scale))
 
     def enter(self, prev):
         """Executes on entering the state
@@ -533,7 +500,6 @@ class GameOverState(object):
         dt = float(pygame.time.get_ticks() - self.timer)
 
         if dt > 500:
-            self.master.player.explode = False
             self.active = True
             self.timer = False
         else:
@@ -542,17 +508,8 @@ class GameOverState(object):
     def update(self):
         """State update"""
         if self.active:
-            # Draw background
-            screen.blit(backgroundObj, (0, 0))
-
-            # Set Rects for buttons and check for mouseover
-            btn_res_rect = pygame.Rect((0, 0), (115, 30))
-            btn_res_rect.center = (187, 310)
-            btn_res_active = btn_res_rect.collidepoint(pygame.mouse.get_pos())
-
-            btn_mm_rect = pygame.Rect((0, 0), (115, 30))
-            btn_mm_rect.center = (187, 345)
-            btn_mm_active = btn_mm_rect.collidepoint(pygame.mouse.get_pos())
+            # Check for mouseover
+            hovered = self.view.update(self.master.mouse.get_pos())
 
             # Test for new highscore
             if self.master.points > self.master.highscore:
@@ -560,19 +517,17 @@ class GameOverState(object):
             else:
                 new_high = False
 
-            # Get and draw the panel
-            panel = self.get_panel(btn_res_active, btn_mm_active, new_high)
-            panel_rect = panel.get_rect()
-            panel_rect.center = (187, 300)
-            screen.blit(panel, panel_rect)
+            # Update the panel and draw it over the background
+            self.get_panel(new_high)
+            screen.blit(self.view.image, self.view.rect)
 
             # Check for mouse clicks and goto appropriate state
-            flag = pygame.mouse.get_pressed()[0]
+            flag = self.master.mouse.get_pressed()[0]
             if flag:
-                if btn_res_active:
+                if hovered is self.btn_restart:
                     self.master.goto(self.master.playingstate)
 
-                elif btn_mm_active:
+                elif hovered is self.btn_save:
                     self.master.goto(self.master.savescorestate)
 
         else:
@@ -588,9 +543,8 @@ class GameOverState(object):
         if type(state) == SaveScoreState:
             state.points = self.master.points
 
-        # Reset gameplay variables and goto next state
-        self.master.points = 0
-        self.master.player.lives = 3
+        # The world is reset by GameManager.new_game when the next game
+        # starts
         self.active = False
         # noinspection PyProtectedMember
         self.master._enter(state)
@@ -618,70 +572,22 @@ class PauseState(object):
         self.leaving = False
         self._nextstate = None
 
-    # noinspection PyMethodMayBeStatic
-    def get_panel(self, btn_res=False, btn_mm=False):
-        """Returns surface for pause screen panel
-
-        Args:
-            btn_res: Flag for resume button mouseover
-            btn_mm: Flag for mainmenu button mouseover
-        """
-
-        # Create panel surface
-        panel = pygame.Surface((300, 200))
-        panel.fill((127, 127, 127))
-        pygame.draw.rect(panel, (65, 65, 65), panel.get_rect(), 5)
-
-        # Draw title
-        lbl_paused = FONT_M.render("PAUSED", True,
-                                   (255, 255, 255))
-        rect_paused = lbl_paused.get_rect()
-        rect_paused.center = (150, 50)
-        panel.blit(lbl_paused, rect_paused)
-
-        # Draw resume button
-        btn_resume = pygame.Surface((115, 30))
-        if btn_res:
-            btn_resume.fill((0, 0, 0))
-            pygame.draw.rect(btn_resume, (65, 65, 65), (3, 3, 109, 24), 1)
-            lbl_resume = FONT_S.render("RESUME", True,
-                                       (255, 255, 255))
-        else:
-            btn_resume.fill((255, 255, 255))
-            pygame.draw.rect(btn_resume, (190, 190, 190), (3, 3, 109, 24), 1)
-            lbl_resume = FONT_S.render("RESUME", True,
-                                       (0, 0, 0))
-
-        rect_lbl_resume = lbl_resume.get_rect()
-        rect_lbl_resume.center = btn_resume.get_rect().center
-        btn_resume.blit(lbl_resume, rect_lbl_resume)
-
-        rect_resume = btn_resume.get_rect()
-        rect_resume.center = (150, 110)
-        panel.blit(btn_resume, rect_resume)
-
-        # Draw mainmenu button
-        btn_mainmenu = pygame.Surface((115, 30))
-        if btn_mm:
-            btn_mainmenu.fill((0, 0, 0))
-            pygame.draw.rect(btn_mainmenu, (65, 65, 65), (3, 3, 109, 24), 1)
-            lbl_mainmenu = FONT_S.render("MAIN MENU", True,
-                                         (255, 255, 255))
-        else:
-            btn_mainmenu.fill((255, 255, 255))
-            pygame.draw.rect(btn_mainmenu, (190, 190, 190), (3, 3, 109, 24), 1)
-            lbl_mainmenu = FONT_S.render("MAIN MENU", True,
-                                         (0, 0, 0))
-
-        rect_lbl_mainmenu = lbl_mainmenu.get_rect()
-        rect_lbl_mainmenu.center = btn_mainmenu.get_rect().center
-        btn_mainmenu.blit(lbl_mainmenu, rect_lbl_mainmenu)
-
-        rect_mainmenu = btn_mainmenu.get_rect()
-        rect_mainmenu.center = (150, 145)
-        panel.blit(btn_mainmenu, rect_mainmenu)
-
-        return panel.convert()
+        self.panel = Panel((300, 200), border=((65, 65, 65), 5),
+                           center=(187, 300))
+        self.panel.add(Label("PAUSED", FONT_M, center=(150, 50)))
+        self.btn_resume = self.panel.add(
+            Button("RESUME", FONT_S, (115, 30), center=(150, 110)))
+        self.btn_mainmenu = self.panel.add(
+            Button("MAIN MENU", FONT_S, (115, 30), center=(150, 145)))
+        self.view = Panel((WIDTH, HEIGHT), background=backgroundObj,
+                          topleft=(0, 0))
+        self.view.add(self.panel)
+        self.zoom_in = Transition(250, scale=(0.0, 1.0))
+        self.zoom_out = Transition(250, scale=(1.0, 0.0))
+
+    def get_panel(self):
+        """Returns surface for pause screen panel"""
+        return self.panel.image
 
     def draw_entry(self, dt):
         """Draws entry animation"""
@@ -689,17 +595,8 @@ class PauseState(object):
         screen.blit(backgroundObj, (0, 0))
 
         # Do animation
-        panel = self.get_panel()
-
-        if dt < 250:
-            panel = pygame.transform.rotozoom(panel, 0, dt / 250)
-            panel_rect = panel.get_rect()
-            panel_rect.center = (187, 300)
-            screen.blit(panel, panel_rect)
-        else:
-            panel_rect = panel.get_rect()
-            panel_rect.center = (187, 300)
-            screen.blit(panel, panel_rect)
+        self.view.update(None)
+        self.zoom_in.draw(screen, self.get_panel(), dt, center=(187, 300))
 
     def draw_exit(self, dt):
         """Draws exit animation"""
@@ -707,12 +604,8 @@ class PauseState(object):
         screen.blit(backgroundObj, (0, 0))
 
         # Do animation
-        panel = self.get_panel()
-        if dt < 250:
-            panel = pygame.transform.rotozoom(panel, 0, (250 - dt) / 250)
-            panel_rect = panel.get_rect()
-            panel_rect.center = (187, 300)
-            screen.blit(panel, panel_rect)
+        self.view.update(None)
+        self.zoom_out.draw(screen, self.get_panel(), dt, center=(187, 300))
 
     def enter(self, prev):
         """Handles state entry
@@ -734,31 +627,17 @@ class PauseState(object):
     def update(self):
         """Handles state update"""
         if self.active and not self.leaving:
-            # Draw background
-            screen.blit(backgroundObj, (0, 0))
-
-            # Set Rects for buttons and check for mouseover
-            btn_res_rect = pygame.Rect((0, 0), (115, 30))
-            btn_res_rect.center = (187, 310)
-            btn_res_active = btn_res_rect.collidepoint(pygame.mouse.get_pos())
-
-            btn_mm_rect = pygame.Rect((0, 0), (115, 30))
-            btn_mm_rect.center = (187, 345)
-            btn_mm_active = btn_mm_rect.collidepoint(pygame.mouse.get_pos())
-
-            # Get panel and draw
-            panel = self.get_panel(btn_res_active, btn_mm_active)
-            panel_rect = panel.get_rect()
-            panel_rect.center = (187, 300)
-            screen.blit(panel, panel_rect)
+            # Check for mouseover and draw panel over the background
+            hovered = self.view.update(self.master.mouse.get_pos())
+            screen.blit(self.view.image, self.view.rect)
 
             # Check for mouseclicks and go to appropriate state
-            flag = pygame.mouse.get_pressed()[0]
+            flag = self.master.mouse.get_pressed()[0]
             if flag:
-                if btn_res_active:
+                if hovered is self.btn_resume:
                     self.master.goto(self.master.playingstate)
 
-                elif btn_mm_active:
+                elif hovered is self.btn_mainmenu:
                     self.master.goto(self.master.mainmenustate)
 
             # Resume on 'Escape' key press
@@ -905,7 +784,8 @@ class Input(object):
         surf = pygame.Surface((170, self.font.get_height()))
         surf.fill((255, 255, 255))
         pygame.draw.rect(surf, (65, 65, 65), surf.get_rect(), 2)
-        surf.blit(self.font.render(self.get_text(), True, (0, 0, 0)), (0, 0))
+        surf.blit(textcache.render(self.font, self.get_text(), True, (0, 0, 0)),
+                  (0, 0))
         return surf.convert()
 
 
@@ -930,51 +810,28 @@ class SaveScoreState(object):
         self.active = False
         self.input = Input()
 
-    def get_panel(self, btn_s=False):
+        self.panel = Panel((300, 200), border=((65, 65, 65), 5),
+                           center=(187, 300))
+        self.panel.add(Label("SAVE SCORE", FONT_M, center=(150, 30)))
+        self.btn_save = self.panel.add(
+            Button("SAVE", FONT_S, (115, 30), center=(150, 150)))
+        self.entry = self.panel.add(
+            Widget(self.input.get_surface(), center=(150, 100)))
+        self._entry_text = self.input.get_text()
+        self.view = Panel((WIDTH, HEIGHT), background=backgroundObj,
+                          topleft=(0, 0))
+        self.view.add(self.panel)
+
+    def get_panel(self):
         """Returns panel surface
 
-        Args:
-            btn_s: Flag for save button mouseover.
+        The text entry is re-rendered only when its text changed.
         """
-        # Create and draw panel surface
-        panel = pygame.Surface((300, 200))
-        panel.fill((127, 127, 127))
-        pygame.draw.rect(panel, (65, 65, 65), panel.get_rect(), 5)
-
-        # Draw title
-        lbl_save = FONT_M.render("SAVE SCORE", True,
-                                 (255, 255, 255))
-        rect_lbl_save = lbl_save.get_rect()
-        rect_lbl_save.center = (150, 30)
-        panel.blit(lbl_save, rect_lbl_save)
-
-        # Draw save button
-        btn_save = pygame.Surface((115, 30))
-        if btn_s:
-            btn_save.fill((0, 0, 0))
-            pygame.draw.rect(btn_save, (65, 65, 65), (3, 3, 109, 24), 1)
-            lbl_save = FONT_S.render("SAVE", True,
-                                     (255, 255, 255))
-        else:
-            btn_save.fill((255, 255, 255))
-            pygame.draw.rect(btn_save, (190, 190, 190), (3, 3, 109, 24), 1)
-            lbl_save = FONT_S.render("SAVE", True,
-                                     (0, 0, 0))
-
-        rect_lbl_save = lbl_save.get_rect()
-        rect_lbl_save.center = btn_save.get_rect().center
-        btn_save.blit(lbl_save, rect_lbl_save)
-
-        rect_save = btn_save.get_rect()
-        rect_save.center = (150, 150)
-        panel.blit(btn_save, rect_save)
-
-        input_ = self.input.get_surface()
-        rect_input = input_.get_rect()
-        rect_input.center = (150, 100)
-        panel.blit(input_, rect_input)
-
-        return panel.convert()
+        text = self.input.get_text()
+        if text != self._entry_text:
+            self._entry_text = text
+            self.entry.set_image(self.input.get_surface())
+        return self.panel.image
 
     def enter(self, prev):
         """Handles state entry
@@ -988,25 +845,18 @@ class SaveScoreState(object):
     def update(self):
         """State update"""
         if self.active:
-            # Set Rect for save button and check for mouseover
-            btn_save_rect = pygame.Rect((0, 0), (115, 30))
-            btn_save_rect.center = (187, 350)
-            btn_save_active = btn_save_rect.collidepoint(pygame.mouse.get_pos())
+            # Check for mouseover
+            hovered = self.view.update(self.master.mouse.get_pos())
 
             # Update text entry
             self.input.update()
 
-            # Draw background
-            screen.blit(backgroundObj, (0, 0))
-
-            # Get and draw panel
-            panel = self.get_panel(btn_save_active)
-            panel_rect = panel.get_rect()
-            panel_rect.center = (187, 300)
-            screen.blit(panel, panel_rect)
+            # Update the panel and draw it over the background
+            self.get_panel()
+            screen.blit(self.view.image, self.view.rect)
 
             # Check for mouse click and go to appropriate state
-            if btn_save_active and pygame.mouse.get_pressed()[0]:
+            if hovered is self.btn_save and self.master.mouse.get_pressed()[0]:
                 if not self.input.get_text():
                     pass  # TODO Play sound and/or animation
                 else:
@@ -1046,75 +896,57 @@ class LeaderBoardState(object):
         self.timer = False
         self.prev = None
 
-    def get_panel(self, btn_b=False):
-        """Returns panel surface
+        self.panel = Panel((300, 500), border=((65, 65, 65), 3),
+                           center=(187, 300))
+        self.panel.add(Label("LEADER BOARD", FONT_L, center=(150, 30)))
 
-        Args:
-            btn_b: Flag for back button mouseover.
-        """
-        # Create and draw panel
-        panel = pygame.Surface((300, 500))
-        panel.fill((127, 127, 127))
-        pygame.draw.rect(panel, (65, 65, 65), panel.get_rect(), 3)
-
-        # Draw title
-        msg = FONT_L.render("LEADER BOARD", True, (255, 255, 255))
-        msg_rect = msg.get_rect()
-        msg_rect.center = (150, 30)
-        panel.blit(msg, msg_rect)
-
-        # Create and draw subpanel to display scores
-        sub_panel = pygame.Surface((240, 385))
+        # Subpanel to display scores on alternately shaded rows
+        stripes = pygame.Surface((240, 385))
         r = pygame.Rect((0, 0), (240, 35))
         for i in range(11):
             if i % 2 == 0:
-                sub_panel.fill((240, 240, 240), r)
+                stripes.fill((240, 240, 240), r)
             else:
-                sub_panel.fill((190, 190, 190), r)
-            try:
-                msg = FONT_S.render(self.master.scores[i][1], True, (0, 0, 0))
-                msg_rect = msg.get_rect()
-                msg_rect.centerx = 60
-                msg_rect.centery = r.centery
-                sub_panel.blit(msg, msg_rect)
-
-                msg = FONT_S.render(str(self.master.scores[i][0]), True, (0, 0, 0))
-                msg_rect = msg.get_rect()
-                msg_rect.centerx = 180
-                msg_rect.centery = r.centery
-                sub_panel.blit(msg, msg_rect)
-            except IndexError:
-                # There are less than 11 saved scores, but we continue the loop
-                # and draw blank spaces
-                pass
+                stripes.fill((190, 190, 190), r)
             r.top += 35
-        pygame.draw.rect(sub_panel, (65, 65, 65), sub_panel.get_rect(), 2)
-        sub_panel_rect = sub_panel.get_rect()
-        sub_panel_rect.topleft = (30, 65)
-        panel.blit(sub_panel, sub_panel_rect)
-
-        # Draw back button
-        btn_back = pygame.Surface((115, 30))
-        if btn_b:
-            btn_back.fill((0, 0, 0))
-            pygame.draw.rect(btn_back, (65, 65, 65), (3, 3, 109, 24), 1)
-            lbl_back = FONT_S.render("BACK", True,
-                                     (255, 255, 255))
-        else:
-            btn_back.fill((255, 255, 255))
-            pygame.draw.rect(btn_back, (190, 190, 190), (3, 3, 109, 24), 1)
-            lbl_back = FONT_S.render("BACK", True,
-                                     (0, 0, 0))
+        sub_panel = self.panel.add(
+            Panel((240, 385), background=stripes,
+                  border=((65, 65, 65), 2), topleft=(30, 65)))
+        self.rows = []
+        for i in range(11):
+            y = 35 * i + 17
+            self.rows.append(
+                (sub_panel.add(Label("", FONT_S, (0, 0, 0), center=(60, y))),
+                 sub_panel.add(Label("", FONT_S, (0, 0, 0), center=(180, y)))))
+
+        self.btn_back = self.panel.add(
+            Button("BACK", FONT_S, (115, 30), center=(150, 473)))
+        self._scores_version = None
 
-        rect_lbl_back = lbl_back.get_rect()
-        rect_lbl_back.center = btn_back.get_rect().center
-        btn_back.blit(lbl_back, rect_lbl_back)
+        self.view = Panel((WIDTH, HEIGHT), background=backgroundObj,
+                          topleft=(0, 0))
+        self.view.add(self.panel)
 
-        rect_back = btn_back.get_rect()
-        rect_back.center = (150, 473)
-        panel.blit(btn_back, rect_back)
+    def get_panel(self):
+        """Returns panel surface
 
-        return panel.convert()
+        The rows are only updated after the scores changed, and then
+        only the rows whose name or score changed are re-rendered.
+        """
+        if self._scores_version == self.master.scores_version:
+            return self.panel.image
+        self._scores_version = self.master.scores_version
+
+        scores = self.master.scores
+        for i, (lbl_name, lbl_score) in enumerate(self.rows):
+            if i < len(scores):
+                lbl_name.set_text(scores[i][1])
+                lbl_score.set_text(str(scores[i][0]))
+            else:
+                # There are less than 11 saved scores, draw blank spaces
+                lbl_name.set_text("")
+                lbl_score.set_text("")
+        return self.panel.image
 
     def enter(self, prev):
         """Handles state entry
@@ -1128,22 +960,15 @@ class LeaderBoardState(object):
     def update(self):
         """Handles state update"""
         if self.active:
-            # Set Rect for back button and check for mouseover
-            btn_back_rect = pygame.Rect((0, 0), (115, 30))
-            btn_back_rect.center = (187, 473 + 50)
-            btn_back_active = btn_back_rect.collidepoint(pygame.mouse.get_pos())
+            # Check for mouseover
+            hovered = self.view.update(self.master.mouse.get_pos())
 
-            # Draw background
-            screen.blit(backgroundObj, (0, 0))
-
-            # Get and draw panel
-            panel = self.get_panel(btn_back_active)
-            panel_rect = panel.get_rect()
-            panel_rect.center = (187, 300)
-            screen.blit(panel, panel_rect)
+            # Update the panel and draw it over the background
+            self.get_panel()
+            screen.blit(self.view.image, self.view.rect)
 
             # Check for mouse click and go to previous state
-            if btn_back_active and pygame.mouse.get_pressed()[0]:
+            if hovered is self.btn_back and self.master.mouse.get_pressed()[0]:
                 if self.prev:
                     if type(self.prev) == SaveScoreState:
                         self.master.goto(self.prev.prev)
@@ -1165,13 +990,17 @@ class LeaderBoardState(object):
 
 # noinspection PyUnresolvedReferences
 class PlayingState(object):
-    """Handles the game logic and graphics
+    """Drives the World simulation and draws it
 
     Attributes:
         master: the attached GameManager instance.
         name: "PLAYING"
         active: Flag indicating whether the state is active
         prev: The previous state
+        particles: ParticleSystem for debris and the engine trail, or
+            None when particles are disabled
+        policy: Optional input policy (see policies.py) whose act(world)
+            inputs are held along with the keyboard's
     """
 
     def __init__(self, master):
@@ -1182,7 +1011,14 @@ class PlayingState(object):
         self.prev = None
 
         self._start_time = 0 # pygame time when gameplay started
-        self._prev_points = 0# score in previous update
+
+        self.particles = None
+        if master.particle_budget:
+            self.particles = ParticleSystem(master.particle_budget)
+            self._debris = self.particles.add_ramp(DEBRIS_RAMP)
+            self._exhaust = self.particles.add_ramp(EXHAUST_RAMP)
+        self._seen = 0  # World time up to which explosions threw debris
+        self.policy = None
 
     # noinspection PyMethodMayBeStatic
     def draw_lives(self, n):
@@ -1190,13 +1026,44 @@ class PlayingState(object):
 
         Args:
             n: Number of 'lives' to draw
+
+        Returns:
+            The Rect covering the icons.
         """
         r = pygame.Rect((0, 0), (28, 28))
         r.right = WIDTH - 2
         r.centery = 18
-        for i in range(n):
-            screen.blit(heartSprite, r)
-            r.left -= 28
+        drawn = pygame.Rect(r.right, r.top, 0, 28)
+        drawn.unionall_ip(screen.blits(
+            [(ATLAS, (r.left - 28 * i, r.top), HEART_AREA) for i in range(n)]))
+        return drawn
+
+    def update_particles(self, world, elapsed):
+        """Emits debris and exhaust, then moves the particles
+
+        Args:
+            world: The World being played
+            elapsed: Milliseconds since the last frame
+        """
+        particles = self.particles
+        roids = world.roids
+        n = roids.count
+
+        # Debris from asteroids that started exploding since last frame
+        new = roids.explode[:n] >= self._seen
+        if new.any():
+            particles.emit(roids.x[:n][new] + roids.w / 2,
+                           roids.y[:n][new] + roids.h / 2,
+                           DEBRIS_PER_HIT, self._debris)
+        self._seen = world.time
+
+        # Engine trail
+        p = world.player.rect
+        trail = int(EXHAUST_RATE * elapsed / 1000.0 + 0.5)
+        particles.emit(p.centerx, p.bottom + 10, trail, self._exhaust,
+                       speed=(0.1, 0.25), angle=np.pi / 2, spread=0.6,
+                       life=(150, 350))
+        particles.update(elapsed)
 
     def get_time(self):
         """Get time since the beginning of gameplay"""
@@ -1213,127 +1080,101 @@ class PlayingState(object):
 
         if self.prev is self.master.mainmenustate or self.prev is self.master.gameoverstate:
             self._start_time = pygame.time.get_ticks()
+            self.master.new_game()
+            self._seen = 0
+            if self.particles:
+                self.particles.clear()
+        self.master.stepper.accumulator = 0.0
         self.active = True
 
     def update(self):
         """Handles game execution"""
-        global ASTEROID_MAX_X, ASTEROID_MIN_Y, ASTEROID_MAX_Y
-
         if self.active:
-            if self.master.points != self._prev_points:
-                self._prev_points = self.master.points
-
-            # Asteroid generation
-            if self.master.newroid == 0:
-                Asteroid(
-                    self.master, random.randint(0, 14) * 25,
-                    random.randint(-ASTEROID_MAX_X, ASTEROID_MAX_X),
-                    random.randint(ASTEROID_MIN_Y, ASTEROID_MAX_Y))
-                self.master.newroid = self.master.roidrate
+            world = self.master.world
+            inputs = 0
 
             # Keybindings
             keys_down = pygame.event.get(KEYDOWN)
             for e in keys_down:
                 if e.key == K_ESCAPE:
-                    self.master.goto(self.master.pausestate)
+                    inputs |= INPUT_ESCAPE
 
                 # Debugging keys
                 # TODO Remove these for final release
-                elif e.key == K_UP:
-                    self.master.roidrate /= 2
-                    if self.master.roidrate < 10:
-                        self.master.roidrate = 10
-                elif e.key == K_DOWN:
-                    self.master.roidrate *= 2
+                # The difficulty keys change the world outside of the
+                # recorded inputs, so they are off while recording
+                elif e.key == K_UP and not self.master.stepper.recorder:
+                    world.roidrate //= 2
+                    if world.roidrate < 10:
+                        world.roidrate = 10
+                elif e.key == K_DOWN and not self.master.stepper.recorder:
+                    world.roidrate *= 2
                 elif e.key == K_RETURN:
                     self.master.goto(self.master.gameoverstate)
+                    return
 
-            # Player movement
+            # Player movement and gun control
             keys = pygame.key.get_pressed()
             if keys[K_LEFT] or keys[K_a]:
-                self.master.player.move(-PLAYER_MOVE_SPEED, 0)
+                inputs |= INPUT_LEFT
             elif keys[K_RIGHT] or keys[K_d]:
-                self.master.player.move(PLAYER_MOVE_SPEED, 0)
-            # Gun control
+                inputs |= INPUT_RIGHT
             if keys[K_SPACE] or keys[K_f]:
-                self.master.player.fire()
-
-            # Collision checks:
-            for a in self.master.roids:
-
-                # Player-Asteroid collision check
-                if a.rect.bottom > self.master.player.rect.top:
-                    if a.rect.colliderect(self.master.player.rect) and not a.explode:
-                        self.master.player.lives -= 1
-                        a.explode = pygame.time.get_ticks()
-                        a.vely = 0
-
-                # Bolt-asteroid collision check
-                for b in self.master.bolts:
-                    if a.rect.colliderect(b.rect):
-                        self.master.points += 5
-                        self.master.bolts.remove(b)
-                        a.explode = pygame.time.get_ticks()
-
-                # Asteroid-asteroid collision check
-                # TODO Collision is not working properly (Asteroids double collide)
-                for a2 in self.master.roids:
-                    if a is not a2:
-                        if a.rect.colliderect(a2.rect):
-                            a.velx = -a.velx
-                            a2.velx = -a2.velx
-
-                            offset = (a.rect.centerx - a2.rect.centerx) / 2 + 1
-                            a.rect.centerx += offset
-                            a2.rect.centerx -= offset
-
-            # Draw background
-            screen.blit(backgroundObj, (0, 0))
-
-            # Update and draw entities
-            # Order is important for layering!
-            for b in self.master.bolts:
-                b.update()
-            for a in self.master.roids:
-                a.update()
-
-            # Update and draw player
-            self.master.player.update()
-
-            # Render points
-            lbl_score = FONT_M.render("SCORE: " + str(self.master.points), True, (255, 255, 255))
-            rect_lbl_score = lbl_score.get_rect()
-            rect_lbl_score.left = 3
-            rect_lbl_score.top = 0
-            screen.blit(lbl_score, rect_lbl_score)
+                inputs |= INPUT_FIRE
+            if self.policy:
+                inputs |= self.policy.act(world)
+
+            prof = self.master.profiler
+            if prof:
+                prof.lap("input")
+            stepper = self.master.stepper
+            ticks = stepper.advance(fpsClock.get_time(), inputs)
+            if inputs & INPUT_ESCAPE:
+                self.master.goto(self.master.pausestate)
+                return
+
+            # Draw background and entities
+            renderer = self.master.renderer
+            starfield = self.master.starfield
+            if renderer:
+                renderer.begin()
+            elif starfield:
+                starfield.step(fpsClock.get_time())
+                starfield.draw(screen)
+            else:
+                screen.blit(backgroundObj, (0, 0))
+            rects = draw_world(world, stepper.alpha)
+            if self.particles:
+                self.update_particles(world, fpsClock.get_time())
+                rects += self.particles.draw(screen)
+            if prof:
+                prof.lap("draw")
+
+            # Render points, composing the number from cached digits
+            lbl_score = textcache.render(FONT_M, "SCORE: ")
+            rect_lbl_score = screen.blit(lbl_score, (3, 0))
+            rects.append(rect_lbl_score.union(SCORE_DIGITS.draw(
+                screen, str(self.master.points), rect_lbl_score.topright)))
 
             # Render lives
             lives = self.master.player.lives
             if lives > 0:
-                self.draw_lives(lives)
-            else:
+                rects.append(self.draw_lives(lives))
+            if prof:
+                prof.lap("hud")
+            if renderer:
+                renderer.add(rects)
+            if ticks and world.game_over:
                 self.master.goto(self.master.gameoverstate)
 
-            # Decrease new asteroid timer
-            self.master.newroid = max(self.master.newroid - fpsClock.get_time(), 0)
-
-            # Progressive difficulty
-            if self.master.points < 750:
-                # Minimum delay: 250 milliseconds
-                self.master.roidrate = 1000 - self.master.points
-            if self.master.points > 550:
-                if self.master.points % 150 == 0 and self.master.points != self._prev_points:
-                    ASTEROID_MAX_X += 1
-                    ASTEROID_MAX_Y += 1
-                if self.master.points % 300 == 0 and self.master.points != self._prev_points:
-                    ASTEROID_MIN_Y += 1
-
     def leave(self, state):
         """Handles state exit
 
         Args:
             state: Next state.
         """
+        if state is self.master.gameoverstate:
+            self.master.finish_replay()
         self.active = False
         # noinspection PyProtectedMember
         self.master._enter(state)
@@ -1346,24 +1187,70 @@ class GameManager(object):
     loading/saving of data.
 
     Attributes:
-        points: Current score
-        bolts: Stores Bolt instances
-        roids: Stores Asteroid instances
-        player: The current instance of Player
+        world: The World simulated by PlayingState
+        stepper: FixedStepper driving world at a fixed timestep
+        points: Current score (stored on world)
+        bolts: Stores Bolt instances (stored on world)
+        roids: Stores Asteroid instances (stored on world)
+        player: The current instance of Player (stored on world)
         scores: Lists all saved scores as tuple (int score, str name)
+        scores_version: Incremented whenever scores changes
+        scores_path: File the scores are loaded from and saved to
         highscore: Current highscore
-        newroid: Countdown to new asteroid generation
-        roidrate: Frequency of new asteroid generation
+        replay_dir: Directory games are recorded to, or None
+        particle_budget: Capacity of the gameplay particle pool, 0 for
+            no particles
+        renderer: DirtyRenderer used during gameplay, or None to redraw
+            and flip the whole screen every frame
+        starfield: Starfield drawn behind gameplay, or None for the
+            static background image. It only scrolls without renderer;
+            with one the stars are drawn once into its background layer,
+            as scrolling would change pixels all over the screen every
+            frame.
+        profiler: FrameProfiler timing every frame, or None. It is set
+            while the profile overlay is shown or a trace is recorded,
+            and by bench.py.
+        overlay: ProfileOverlay drawing profiler, or None
+        tracer: TraceWriter recording frames and state changes, or None
+        auditor: LifecycleAuditor checking every game for leaks, or None
+        mouse: Where the menus read the pointer from with get_pos() and
+            get_pressed(); pygame.mouse unless something else drives
+            the menus, like soak.Autopilot
     """
 
-    def __init__(self):
+    def __init__(self, replay_dir=None, dirty_rects=False,
+                 particle_budget=PARTICLE_BUDGET, starfield=False,
+                 scores_path=SCORES_FILE):
         """Inits GameManager
 
         Instantiates all states and player. Loads saved scores.
+
+        Args:
+            replay_dir: Directory to record a replay of every game to
+            dirty_rects: Redraw only changed areas during gameplay
+            particle_budget: Capacity of the gameplay particle pool
+            starfield: Draw a procedural starfield behind gameplay
+            scores_path: File the scores are loaded from and saved to
         """
-        self.points = 0
-        self.bolts = []
-        self.roids = []
+        self.replay_dir = replay_dir
+        self.scores_path = scores_path
+        self.particle_budget = particle_budget
+        self.starfield = None
+        background = backgroundObj
+        if starfield:
+            self.starfield = Starfield((WIDTH, HEIGHT))
+            if dirty_rects:
+                background = self.starfield.render()
+        self.renderer = None
+        if dirty_rects:
+            self.renderer = DirtyRenderer(screen, background)
+        self.world = World()
+        self.stepper = FixedStepper(self.world)
+        self.profiler = None
+        self.overlay = None
+        self.tracer = None
+        self.auditor = None
+        self.mouse = pygame.mouse
 
         self.openingstate = OpeningState(self)
         self.mainmenustate = MainMenuState(self)
@@ -1373,21 +1260,65 @@ class GameManager(object):
         self.leaderboardstate = LeaderBoardState(self)
         self.gameoverstate = GameOverState(self)
 
-        self.player = Player(self)
         self.scores = []
+        self.scores_version = 0
         self.load_scores()
         self.highscore = self.get_highscore()
-        self.newroid = 0
-        self.roidrate = 1000  # New asteroid every 1000 milliseconds
 
         self._state = None
         self._enter(self.openingstate)
 
+    @property
+    def points(self):
+        """Current score of the world"""
+        return self.world.points
+
+    @points.setter
+    def points(self, value):
+        self.world.points = value
+
+    @property
+    def player(self):
+        """Player of the world"""
+        return self.world.player
+
+    @property
+    def bolts(self):
+        """Bolts of the world"""
+        return self.world.bolts
+
+    @property
+    def roids(self):
+        """Asteroids of the world"""
+        return self.world.roids
+
+    def new_game(self):
+        """Resets the world for a freshly seeded game
+
+        Starts recording it when replay_dir is set.
+        """
+        self.finish_replay()
+        self.world.reset()
+        self.stepper = FixedStepper(self.world)
+        if self.replay_dir:
+            self.stepper.recorder = ReplayRecorder(self.world)
+        if self.auditor:
+            self.auditor.game_started()
+
+    def finish_replay(self):
+        """Saves and detaches the replay of the current game, if any"""
+        recorder = self.stepper.recorder
+        if recorder and recorder.replay.ticks:
+            name = "replay-%d-%d.msr" % (int(time.time()), self.world.seed)
+            recorder.replay.save(os.path.join(self.replay_dir, name))
+        self.stepper.recorder = None
+
     # noinspection PyBroadException
     def load_scores(self):
-        """Loads scores from /user_scores.txt"""
+        """Loads scores from scores_path"""
         self.scores = []
-        with open("user_scores.txt", 'r') as f:
+        self.scores_version += 1
+        with open(self.scores_path, 'r') as f:
             lines = f.readlines()
             for L in lines:
                 L = L.split(',')
@@ -1409,8 +1340,9 @@ class GameManager(object):
         """
         self.scores.append((score, name))
         self.scores.sort(key=lambda t: t[0], reverse=True)
+        self.scores_version += 1
 
-        with open("user_scores.txt", 'w') as f:
+        with open(self.scores_path, 'w') as f:
             for l in self.scores:
                 f.write(str(l[0]) + ',' + l[1] + '\n')
 
@@ -1421,11 +1353,101 @@ class GameManager(object):
         else:
             return 0
 
+    def _update_profiler(self):
+        """Keeps a profiler only while the overlay or a trace uses it"""
+        if self.overlay or self.tracer:
+            if not self.profiler:
+                self.profiler = FrameProfiler()
+            self.profiler.trace = self.tracer
+        else:
+            self.profiler = None
+        self.world.profiler = self.profiler
+
+    def toggle_profiler(self):
+        """Shows or hides the profile overlay
+
+        Frames are only timed while the overlay is shown or a trace is
+        being recorded.
+        """
+        if self.overlay:
+            self.overlay = None
+        else:
+            self.profiler = self.profiler or FrameProfiler()
+            self.overlay = ProfileOverlay(self.profiler, FONT_MONO_S)
+        self._update_profiler()
+
+    def start_trace(self, path):
+        """Starts recording a Chrome trace of every frame to path"""
+        self.stop_trace()
+        self.tracer = TraceWriter(path)
+        self._update_profiler()
+
+    def stop_trace(self):
+        """Finishes the trace being recorded, if any"""
+        if self.tracer:
+            self.tracer.close()
+            self.tracer = None
+            self._update_profiler()
+
+    def shutdown(self):
+        """Saves the replay being recorded, finishes the trace, prints the
+        audit report and exits the game
+        """
+        self.finish_replay()
+        self.stop_trace()
+        if self.auditor:
+            print(self.auditor.format_report())
+        pygame.quit()
+        sys.exit()
+
     def update(self):
         """Calls the current states update function"""
+        # F3 toggles the profile overlay in every state; other key
+        # presses are left for the state
+        if pygame.event.peek(KEYDOWN):
+            for e in pygame.event.get(KEYDOWN):
+                if e.key == K_F3:
+                    self.toggle_profiler()
+                else:
+                    pygame.event.post(e)
         if self._state:
             self._state.update()
 
+    def present(self):
+        """Pushes the frame drawn by the current state to the display"""
+        prof = self.profiler
+        drawing = self.renderer and self.renderer.drawing
+        if prof:
+            prof.lap("update")
+            if self.overlay:
+                rect = self.overlay.draw(screen, [("roids", len(self.roids)),
+                                                  ("bolts", len(self.bolts))])
+                if drawing:
+                    self.renderer.add(rect)
+            prof.lap("overlay")
+        if drawing:
+            self.renderer.present()
+        else:
+            pygame.display.flip()
+            if self.renderer:
+                # Another state drew over the screen
+                self.renderer.invalidate()
+        if prof:
+            prof.lap("flip")
+
+    def end_frame(self):
+        """Closes the profiled frame after the frame rate cap's sleep"""
+        if self.profiler:
+            self.profiler.lap("tick")
+            self.profiler.end_frame()
+        tracer = self.tracer
+        if tracer:
+            tracer.counter("entities", {"roids": len(self.roids),
+                                        "bolts": len(self.bolts)})
+            tracer.counter("roidrate", {"roidrate": self.world.roidrate})
+        if self.auditor:
+            self.auditor.frame()
+
     def get_state(self):
         """Returns the name of the current state"""
         return self._state.name
@@ -1436,6 +1458,9 @@ class GameManager(object):
         Args:
             state: Next state.
         """
+        if self.tracer:
+            self.tracer.instant("goto " + state.name,
+                                {"from": self._state.name, "to": state.name})
         self._state.leave(state)
 
     def _enter(self, state):
@@ -1448,171 +1473,63 @@ class GameManager(object):
         """
         prev = self._state
         self._state = state
+        if self.tracer:
+            self.tracer.instant(state.name, {"from": prev and prev.name,
+                                             "to": state.name})
         self._state.enter(prev)
 
 
-class Player(object):
-    """Handles player movement and stores player variables
-
-    Attributes:
-        master: The attached GameManager instance
-        rect: Stores the player's Rect for position and collisions
-        lives: Remaining lives
-        can_fire: Countdown until the player can fire a bolt again
-        explode: Timer for explosion animation
-    """
-
-    def __init__(self, master):
-        """Inits the player"""
-        self.master = master
-        self.rect = pygame.Rect(0, 0, 75, 35)
-        self.rect.centerx = 187
-        self.rect.centery = 550
-        self.lives = 3
-        self.can_fire = 0
-        self.explode = False
-
-    def move(self, x, y):
-        """Moves the player by specified offset
-
-        Checks for collisions with the edge of the window.
-
-        Args:
-            x: Offset in the x direction
-            y: Offset in the y direction
-        """
-        self.rect = self.rect.move(x, y)
-        if self.rect.centerx < 0:
-            self.rect.centerx = 0
-        if self.rect.centerx > WIDTH:
-            self.rect.centerx = WIDTH
-
-    def fire(self):
-        """Fires a new Bolt instance"""
-        if self.can_fire == 0:
-            Bolt(self.master, self.rect.centerx - 18, self.rect.top - 25)
-            self.can_fire = 3
-
-    def update(self):
-        """Handles drawing"""
-        self.can_fire = max(self.can_fire - 1, 0)
-        self.draw()
-
-    def draw(self):
-        """Draws Player sprite animation"""
-        if not self.explode:
-            r = (self.rect.left, self.rect.top - 25)
-            if pygame.time.get_ticks() % 200 < 100:
-                screen.blit(playerSprite1, r)
-            else:
-                screen.blit(playerSprite2, r)
-        else:
-            dt = pygame.time.get_ticks() - self.explode
-            if dt < 150:
-                pygame.draw.circle(screen, (255, 127, 31), self.rect.center, dt / 2)
-
-
-class Bolt(object):
-    """Handles Bolt movement
-
-    Attributes:
-        master: The attached GameManager instance
-        rect: Bolt Rect for position and collisions
-        id: Index in master.bolts
-    """
-
-    def __init__(self, master, x, y):
-        """Inits Bolt and adds reference to master.bolts"""
-        self.master = master
-        self.rect = pygame.Rect(x, y, 10, 30)
-        self.id = len(master.bolts)
-        self.master.bolts.append(self)
-
-    def update(self):
-        """Handles movement and drawing"""
-        self.rect = self.rect.move(0, -25)
-        if self.rect.bottom < 0:
-            self.master.bolts.remove(self)
-        self.draw()
-
-    def draw(self):
-        """Draws the bolt sprite"""
-        screen.blit(boltSprite1, self.rect.topleft)
-
-
-class Asteroid(object):
-    """Handles asteroid movement and collisions
-
-    Attributes:
-        master: The attached GameManager instance
-        rect: The Asteroid rect for position and collisions
-        velx: Velocity in the x direction
-        vely: Velocity in the  y direction
-        explode: Timer for explosion animations
-    """
-
-    def __init__(self, master, x, velx=0, vely=5):
-        """Inits Asteroid
-
-        Chooses a sprite at random from ASTEROID_SPRITES.
-
-        Args:
-            x: The x coordinate
-            velx: Initial velocity in the x direction
-            vely: Initial velocity in the y direction (Default: 5)
-        """
-        self.master = master
-        self.rect = pygame.Rect(x, -25, 25, 25)
-        self.velx = velx
-        self.vely = vely
-
-        self._sprite = ASTEROID_SPRITES[random.randint(0, len(ASTEROID_SPRITES) - 1)]
-
-        self.master.roids.append(self)
-        self.explode = False
-
-    def update(self):
-        """Handles asteroid movement and collisions"""
-        self.rect = self.rect.move(self.velx, self.vely)
-        if self.rect.left < 0:
-            self.rect.left = 0
-            self.velx = -self.velx
-        if self.rect.right > WIDTH:
-            self.rect.right = WIDTH
-            self.velx = -self.velx
-
-        if self.rect.top > HEIGHT:
-            self.master.roids.remove(self)
-            self.master.goto(self.master.gameoverstate)
-
-        self.draw()
-
-    def draw(self):
-        """Draws sprite and iff self.explode, draws the explosion animation
-
-        Deletes reference from self.master.roids upon completion of explosion.
-        """
-        screen.blit(self._sprite, self.rect)
-
-        if self.explode:
-            dt = pygame.time.get_ticks() - self.explode
-            pygame.draw.circle(screen, (255, 255, 255), self.rect.center, dt / 2)
-            if dt > 50:
-                self.explode = False
-                self.master.roids.remove(self)
-
-
-manager = GameManager()
-
-# Mainloop
-while True:
-
-    manager.update()
-
-    for event in pygame.event.get():
-        if event.type == QUIT:
-            pygame.quit()
-            sys.exit()
-
-    pygame.display.flip()
-    fpsClock.tick(FPS)
+def main(argv=None):
+    """Runs the game until the window is closed"""
+    parser = argparse.ArgumentParser(description="Meteor Storm")
+    parser.add_argument("--record", metavar="DIR",
+                        help="save a replay of every game to DIR")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="only redraw changed areas during gameplay")
+    parser.add_argument("--particles", type=int, default=PARTICLE_BUDGET,
+                        metavar="N",
+                        help="particle budget, 0 to disable (default: %d)"
+                        % PARTICLE_BUDGET)
+    parser.add_argument("--starfield", action="store_true",
+                        help="scroll a procedural starfield behind gameplay "
+                        "(static with --dirty-rects)")
+    parser.add_argument("--profile", action="store_true",
+                        help="start with the profile overlay shown (F3)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="write a Chrome trace of every frame to FILE")
+    parser.add_argument("--audit", action="store_true",
+                        help="check every game for leaked entities and "
+                        "growing memory; print a report on exit")
+    parser.add_argument("--asset-timings", action="store_true",
+                        help="print how long each sprite took to load")
+    args = parser.parse_args(argv)
+    if args.asset_timings:
+        print(assets.format_timings())
+    if args.record and not os.path.isdir(args.record):
+        os.makedirs(args.record)
+
+    manager = GameManager(args.record, args.dirty_rects, args.particles,
+                          args.starfield)
+    if args.profile:
+        manager.toggle_profiler()
+    if args.trace:
+        manager.start_trace(args.trace)
+    if args.audit:
+        manager.auditor = LifecycleAuditor(manager)
+
+    # Mainloop
+    while True:
+
+        manager.update()
+
+        for event in pygame.event.get():
+            if event.type == QUIT:
+                manager.shutdown()
+
+        manager.present()
+        fpsClock.tick(FPS)
+        manager.end_frame()
+
+
+if __name__ == "__main__":
+    main()
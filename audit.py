@@ -0,0 +1,185 @@
+"""Entity lifecycle auditing and leak detection for long sessions
+
+LifecycleAuditor watches a running GameManager. Every frame it samples
+the live asteroid and bolt counts and how many strings Font.render
+rasterized. Every SURFACE_FRAMES frames it counts the live Surfaces,
+which covers every way of making one (Surface(), copy, convert, the
+transforms, Font.render), to get the Surfaces allocated per frame and
+still alive at the next count. Counting takes a scan of every object, so
+it isn't done every frame, and Surfaces dropped between two counts aren't
+seen. At the start of every game, right after the world reset, it
+checks the reset left no entities behind and takes a snapshot of the
+process: tracemalloc's traced memory, the number of objects tracked by
+the garbage collector and the number of live Surfaces outside the
+bounded text cache. A value that grew in each of AUDIT_GAMES consecutive
+games, by at least its LEAK_RATES on average, is reported as a leak
+along with the source lines whose allocations grew the most since the
+previous game. The minimum rates keep caches that fill up over the first
+games from being reported.
+"""
+import gc
+import sys
+import tracemalloc
+
+import pygame
+
+import textcache
+
+AUDIT_GAMES = 5  # Consecutive games of growth reported as a leak
+TRACE_FRAMES = 8  # Stack depth kept by tracemalloc
+TOP_GROWTH = 3  # Source lines listed per snapshot comparison
+SURFACE_FRAMES = 60  # Frames between counts of the live Surfaces
+# Smallest average growth per game reported as a leak
+LEAK_RATES = {"traced_kib": 16.0, "objects": 100, "surfaces": 1}
+
+
+def count_surfaces():
+    """Returns the number of live Surfaces held by Python containers
+
+    Surfaces aren't tracked by the garbage collector themselves, so they
+    are found among the referents of every tracked object.
+    """
+    seen = set()
+    for obj in gc.get_referents(*gc.get_objects()):
+        if isinstance(obj, pygame.Surface):
+            seen.add(id(obj))
+    return len(seen)
+
+
+class LifecycleAuditor(object):
+    """Tracks per-game resource use of a GameManager
+
+    Attributes:
+        manager: The audited GameManager
+        games: List of one dict per started game with its snapshot
+            ("game", "traced_kib", "objects", "surfaces") and, once it
+            ended, the stats of its frames ("frames", "peak_roids",
+            "peak_bolts", "text_renders", "max_text_renders",
+            "peak_surfaces" and "surfaces_per_frame", the net growth of
+            the live Surfaces between the game's first and last count)
+        leaks: List of messages about values that kept growing or
+            entities that outlived a reset
+        window: Consecutive games of growth reported as a leak
+        out: File the messages are written to as they are found, or None
+        ignore: Source files whose allocations are left out of the
+            snapshots, e.g. a harness driving the game
+    """
+
+    def __init__(self, manager, window=AUDIT_GAMES, out=sys.stderr,
+                 ignore=()):
+        """Inits LifecycleAuditor and starts tracemalloc"""
+        self.manager = manager
+        self.window = window
+        self.out = out
+        self.ignore = list(ignore)
+        self.games = []
+        self.leaks = []
+        self._snapshot = None
+        self._frame_stats()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    def _frame_stats(self):
+        """Starts counting a game's frames"""
+        self._frames = 0
+        self._peak_roids = 0
+        self._peak_bolts = 0
+        self._max_text = 0
+        self._text_start = self._text_seen = textcache.cache.misses
+        self._surfaces = []  # (frame, live Surfaces) counts of the game
+
+    def _flag(self, message):
+        """Records a problem"""
+        self.leaks.append(message)
+        if self.out:
+            self.out.write("audit: %s\n" % message)
+
+    def frame(self):
+        """Samples the frame that just finished"""
+        self._frames += 1
+        world = self.manager.world
+        self._peak_roids = max(self._peak_roids, world.roids.count)
+        self._peak_bolts = max(self._peak_bolts, world.bolts.count)
+        misses = textcache.cache.misses
+        self._max_text = max(self._max_text, misses - self._text_seen)
+        self._text_seen = misses
+        if self._frames % SURFACE_FRAMES == 0:
+            self._surfaces.append((self._frames, self._live_surfaces()))
+
+    @staticmethod
+    def _live_surfaces():
+        """Returns the live Surfaces outside the bounded text cache"""
+        return count_surfaces() - len(textcache.cache)
+
+    def game_started(self):
+        """Closes the previous game and snapshots the freshly reset world"""
+        if self.games:
+            counts = self._surfaces
+            self.games[-1].update(
+                frames=self._frames, peak_roids=self._peak_roids,
+                peak_bolts=self._peak_bolts,
+                text_renders=self._text_seen - self._text_start,
+                max_text_renders=self._max_text,
+                peak_surfaces=max(n for _, n in counts) if counts else None,
+                surfaces_per_frame=(
+                    (counts[-1][1] - counts[0][1]) /
+                    float(counts[-1][0] - counts[0][0])
+                    if len(counts) > 1 else None))
+        self._frame_stats()
+
+        world = self.manager.world
+        game = len(self.games) + 1
+        if world.roids.count or world.bolts.count:
+            self._flag("game %d started with %d asteroids and %d bolts "
+                       "left over" % (game, world.roids.count,
+                                      world.bolts.count))
+
+        # Leave out the auditor's own records
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, path) for path in
+             [tracemalloc.__file__, __file__] + self.ignore])
+        record = {"game": game,
+                  "traced_kib": sum(t.size for t in snapshot.traces) / 1024.0,
+                  "objects": len(gc.get_objects()),
+                  "surfaces": self._live_surfaces()}
+        if self._snapshot is not None:
+            record["growth"] = [
+                str(stat) for stat in
+                snapshot.compare_to(self._snapshot, "lineno")[:TOP_GROWTH]
+                if stat.size_diff > 0]
+        self._snapshot = snapshot
+        self.games.append(record)
+        self._check_growth()
+
+    def _check_growth(self):
+        """Flags metrics that grew across the last window games"""
+        # The first snapshot predates everything loaded by the first frames
+        recent = self.games[1:][-(self.window + 1):]
+        if len(recent) <= self.window:
+            return
+        for metric, rate in sorted(LEAK_RATES.items()):
+            values = [g[metric] for g in recent]
+            if (all(b > a for a, b in zip(values, values[1:])) and
+                    values[-1] - values[0] >= rate * self.window):
+                self._flag("%s grew for %d games: %s" % (
+                    metric, self.window,
+                    " -> ".join("%.0f" % v for v in values)))
+                for line in recent[-1].get("growth", []):
+                    self._flag("  " + line)
+
+    def format_report(self):
+        """Returns the per-game records and leaks as a table"""
+        lines = ["%5s %7s %10s %8s %9s %7s %7s %6s %9s %8s" % (
+            "game", "frames", "traced KiB", "objects", "surfaces",
+            "roids", "bolts", "texts", "peak surf", "surf/f")]
+        for g in self.games:
+            rate = g.get("surfaces_per_frame")
+            lines.append("%5d %7s %10.0f %8d %9d %7s %7s %6s %9s %8s" % (
+                g["game"], g.get("frames", "-"), g["traced_kib"],
+                g["objects"], g["surfaces"], g.get("peak_roids", "-"),
+                g.get("peak_bolts", "-"), g.get("text_renders", "-"),
+                g.get("peak_surfaces") or "-",
+                "-" if rate is None else "%.3f" % rate))
+        lines.extend(self.leaks or ["no leaks found"])
+        return "\n".join(lines)
@@ -0,0 +1,181 @@
+"""Runs many seeded headless games of Meteor Storm in parallel
+
+Each game is a World driven by an input policy from policies.py. Games
+are spread over a process pool and their results are aggregated into a
+summary table, which makes it practical to tune the asteroid spawn rate
+and speed progression over thousands of games.
+
+Usage:
+    python batch.py -n 1000 --policy dodge --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from policies import POLICIES, make_policy
+from world import (TICK_RATE, ROIDRATE, ASTEROID_MAX_X, ASTEROID_MIN_Y,
+                   ASTEROID_MAX_Y, World)
+
+MAX_TICKS = TICK_RATE * 60 * 10  # Ten minutes of gameplay
+
+# Columns of the summary table: (result key, heading)
+SUMMARY_COLUMNS = (("score", "score"),
+                   ("survival", "survival s"),
+                   ("spawned", "spawned"),
+                   ("destroyed", "destroyed"),
+                   ("ticks_per_sec", "ticks/s"))
+
+
+def run_game(seed, policy="dodge", max_ticks=MAX_TICKS, params=None):
+    """Plays one headless game to the end
+
+    Args:
+        seed: Seed for the World and the policy
+        policy: Name of the policy in policies.POLICIES
+        max_ticks: Ticks after which the game is stopped
+        params: Dict of extra World keyword arguments
+
+    Returns:
+        A dict with the game's seed, score, survival time in seconds,
+        ticks, asteroids spawned and destroyed, simulation speed in
+        ticks/sec and whether the game ended before max_ticks.
+    """
+    world = World(seed, **(params or {}))
+    player = make_policy(policy, seed)
+
+    start = time.perf_counter()
+    while not world.game_over and world.ticks < max_ticks:
+        world.step(player.act(world))
+    elapsed = time.perf_counter() - start
+
+    return {"seed": seed,
+            "score": world.points,
+            "survival": world.time / 1000.0,
+            "ticks": world.ticks,
+            "spawned": world.spawned,
+            "destroyed": world.destroyed,
+            "ticks_per_sec": world.ticks / elapsed if elapsed else 0.0,
+            "finished": world.game_over}
+
+
+def _run_game(args):
+    """Unpacks arguments for run_game in a pool worker"""
+    return run_game(*args)
+
+
+def run_batch(seeds, policy="dodge", max_ticks=MAX_TICKS, params=None,
+              workers=None):
+    """Plays one game per seed across a process pool
+
+    Args:
+        seeds: Iterable of integer seeds
+        policy: Name of the policy in policies.POLICIES
+        max_ticks: Ticks after which each game is stopped
+        params: Dict of extra World keyword arguments
+        workers: Number of worker processes (default: CPU count). With
+            1 the games run in this process.
+
+    Returns:
+        List of run_game results in seed order.
+    """
+    jobs = [(seed, policy, max_ticks, params) for seed in seeds]
+    if workers == 1:
+        return [_run_game(job) for job in jobs]
+    with ProcessPoolExecutor(workers) as pool:
+        chunk = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+        return list(pool.map(_run_game, jobs, chunksize=chunk))
+
+
+def percentile(values, q):
+    """Returns the q-th percentile (0-100) of a sorted list"""
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * q / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(results):
+    """Aggregates run_game results
+
+    Returns:
+        Dict mapping each SUMMARY_COLUMNS key to a dict of mean, min,
+        p50, p95 and max.
+    """
+    summary = {}
+    for key, _ in SUMMARY_COLUMNS:
+        values = sorted(r[key] for r in results)
+        summary[key] = {
+            "mean": sum(values) / float(len(values)) if values else 0.0,
+            "min": values[0] if values else 0.0,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "max": values[-1] if values else 0.0,
+        }
+    return summary
+
+
+def format_summary(summary, games, seconds):
+    """Returns the summary as a printable table"""
+    stats = ("mean", "min", "p50", "p95", "max")
+    lines = ["%-12s" % "" + "".join("%12s" % s for s in stats)]
+    for key, heading in SUMMARY_COLUMNS:
+        row = summary[key]
+        lines.append("%-12s" % heading +
+                     "".join("%12.1f" % row[s] for s in stats))
+    lines.append("%d games in %.1f s" % (games, seconds))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--games", type=int, default=100,
+                        help="number of games to play (default: 100)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the first game; game i uses seed + i")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="dodge",
+                        help="input policy (default: dodge)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS,
+                        help="stop games after this many ticks")
+    parser.add_argument("--roidrate", type=int, default=ROIDRATE,
+                        help="delay between asteroids at zero points in ms")
+    parser.add_argument("--max-x", type=int, default=ASTEROID_MAX_X,
+                        help="starting maximum horizontal asteroid speed")
+    parser.add_argument("--min-y", type=int, default=ASTEROID_MIN_Y,
+                        help="starting minimum vertical asteroid speed")
+    parser.add_argument("--max-y", type=int, default=ASTEROID_MAX_Y,
+                        help="starting maximum vertical asteroid speed")
+    parser.add_argument("--json", metavar="PATH",
+                        help="also write per-game results and the summary")
+    args = parser.parse_args(argv)
+
+    params = {"base_roidrate": args.roidrate, "max_x": args.max_x,
+              "min_y": args.min_y, "max_y": args.max_y}
+    seeds = range(args.seed, args.seed + args.games)
+
+    start = time.perf_counter()
+    results = run_batch(seeds, args.policy, args.max_ticks, params,
+                        args.workers)
+    seconds = time.perf_counter() - start
+
+    summary = summarize(results)
+    print(format_summary(summary, len(results), seconds))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"params": params, "policy": args.policy,
+                       "summary": summary, "games": results}, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,330 @@
+"""Scripted performance scenarios for Meteor Storm
+
+Each scenario sets up a seeded game or menu in a fresh GameManager and
+runs frames headless through the real update/present path on a fixed
+one-tick-per-frame clock, so runs do the same work on every machine.
+Results are frames and ticks per second, per-phase timings from
+profiler.FrameProfiler and peak traced memory, printed as a table and
+optionally written as JSON.
+
+A results file saved with --save-baseline can be passed back with
+--baseline to fail (exit status 1) when a metric regressed by more than
+its tolerance. Timings only compare meaningfully on the same machine.
+
+Usage:
+    python bench.py
+    python bench.py -k roids_1000 -k menu_pause --json out.json
+    python bench.py --save-baseline bench-baseline.json
+    python bench.py --baseline bench-baseline.json --tolerance frame_p95_ms=0.5
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+import asteroids
+from policies import ScriptedPolicy
+from profiler import FrameProfiler
+from world import (WIDTH, TICK_MS, ASTEROID_CAPACITY, NUM_ASTEROID_SPRITES,
+                   World, FixedStepper)
+
+MEMORY_FRAMES = 10  # Frames run under tracemalloc per scenario
+FIELD_AREA = 4 * 25 * 25  # Square pixels of field per asteroid
+
+# Allowed relative change per metric before --baseline reports it
+TOLERANCES = {"frame_p50_ms": 0.25,
+              "frame_p95_ms": 0.5,
+              "ticks_per_sec": 0.25,
+              "peak_kib": 0.25}
+HIGHER_IS_BETTER = ("ticks_per_sec",)
+
+
+class FixedClock(object):
+    """Stands in for asteroids.fpsClock, one tick per frame"""
+
+    # noinspection PyMethodMayBeStatic
+    def get_time(self):
+        """Returns the length of a simulation tick"""
+        return TICK_MS
+
+    def tick(self, framerate=0):
+        """Doesn't wait"""
+        return TICK_MS
+
+
+def _play(manager, roids=0, seed=0, policy=None, area=FIELD_AREA):
+    """Enters PlayingState on a world with roids asteroids
+
+    The asteroids are spread over a field of area square pixels each
+    that ends above the player and reaches past the top of the screen
+    when it has to. They only drift sideways, so they never reach the
+    player, and no new asteroids spawn.
+    """
+    world = World(seed, asteroid_capacity=max(roids + 64, ASTEROID_CAPACITY),
+                  base_roidrate=10 ** 9)
+    world.newroid = world.roidrate
+    rng = np.random.default_rng(seed)
+    size = world.roids.w
+    bottom = world.player.rect.top - 2 * size
+    top = min(0, bottom - roids * area // WIDTH)
+    for x, y, velx, sprite in zip(
+            rng.integers(0, WIDTH - size, roids).tolist(),
+            rng.integers(top, bottom, roids).tolist(),
+            rng.integers(-3, 4, roids).tolist(),
+            rng.integers(0, NUM_ASTEROID_SPRITES, roids).tolist()):
+        world.roids.add(x, y, velx, 0, sprite)
+    manager.world = world
+    manager.stepper = FixedStepper(world)
+    manager.playingstate.policy = policy
+    # noinspection PyProtectedMember
+    manager._enter(manager.playingstate)
+
+
+def scenario_empty(manager):
+    """Gameplay with no asteroids"""
+    _play(manager)
+
+
+def scenario_roids_100(manager):
+    """Gameplay among 100 asteroids"""
+    _play(manager, 100)
+
+
+def scenario_roids_1000(manager):
+    """Gameplay among 1,000 asteroids"""
+    _play(manager, 1000)
+
+
+def scenario_roids_10000(manager):
+    """Gameplay among 10,000 asteroids"""
+    _play(manager, 10000)
+
+
+def scenario_dense_fire(manager):
+    """Sweeping continuous fire into 400 asteroids packed on screen"""
+    _play(manager, 400, policy=ScriptedPolicy(), area=0)
+
+
+def scenario_gameover(manager):
+    """Game over entry animation exploding a screen full of asteroids"""
+    _play(manager, 400, area=0)
+    manager.goto(manager.gameoverstate)
+
+
+def scenario_menu_main(manager):
+    """Idling in the main menu"""
+    # noinspection PyProtectedMember
+    manager._enter(manager.mainmenustate)
+    settle_active(manager, manager.mainmenustate)
+
+
+def scenario_menu_pause(manager):
+    """Idling in the pause menu over a game"""
+    _play(manager, 100)
+    manager.goto(manager.pausestate)
+    settle_active(manager, manager.pausestate)
+
+
+def scenario_menu_leaderboard(manager):
+    """Idling in the leader board"""
+    # noinspection PyProtectedMember
+    manager._enter(manager.leaderboardstate)
+
+
+# (name, setup, frames measured, real milliseconds to settle first)
+SCENARIOS = (("empty", scenario_empty, 600, 100),
+             ("roids_100", scenario_roids_100, 300, 100),
+             ("roids_1000", scenario_roids_1000, 120, 100),
+             ("roids_10000", scenario_roids_10000, 60, 0),
+             ("dense_fire", scenario_dense_fire, 300, 100),
+             ("gameover", scenario_gameover, 60, 0),
+             ("menu_main", scenario_menu_main, 600, 100),
+             ("menu_pause", scenario_menu_pause, 600, 100),
+             ("menu_leaderboard", scenario_menu_leaderboard, 600, 100))
+
+
+def run_frames(manager, frames):
+    """Runs frames through the main loop's update/present cycle"""
+    for _ in range(frames):
+        manager.update()
+        pygame.event.get()
+        manager.present()
+        manager.end_frame()
+
+
+def settle(manager, ms):
+    """Runs frames for ms real milliseconds, e.g. to finish a transition"""
+    end = time.perf_counter() + ms / 1000.0
+    while time.perf_counter() < end:
+        run_frames(manager, 1)
+
+
+def settle_active(manager, state):
+    """Runs frames until state has been entered and finished its animation"""
+    # noinspection PyProtectedMember
+    while manager._state is not state or not state.active:
+        run_frames(manager, 1)
+
+
+def run_scenario(setup, frames, warmup=0):
+    """Measures one scenario
+
+    Args:
+        setup: Function preparing a fresh GameManager
+        frames: Number of frames measured
+        warmup: Real milliseconds of frames run before measuring
+
+    Returns:
+        A dict of frames_per_sec, ticks_per_sec (0 when the world didn't
+        run), frame_p50_ms, frame_p95_ms, frame_p99_ms, peak_kib and
+        phases, a dict mapping each phase to its [p50, p95, p99] ms.
+    """
+    asteroids.fpsClock = FixedClock()
+
+    manager = asteroids.GameManager()
+    setup(manager)
+    settle(manager, warmup)
+    profiler = FrameProfiler(frames)
+    manager.profiler = manager.world.profiler = profiler
+    ticks = manager.world.ticks
+    start = time.perf_counter()
+    run_frames(manager, frames)
+    seconds = time.perf_counter() - start
+    ticks = manager.world.ticks - ticks
+    stats = profiler.percentiles()
+
+    # Memory is traced in a separate run as tracemalloc slows Python down
+    manager = asteroids.GameManager()
+    setup(manager)
+    settle(manager, warmup)
+    tracemalloc.start()
+    try:
+        run_frames(manager, min(frames, MEMORY_FRAMES))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    frame = stats.pop("frame")
+    return {"frames_per_sec": frames / seconds,
+            "ticks_per_sec": ticks / seconds,
+            "frame_p50_ms": frame[0],
+            "frame_p95_ms": frame[1],
+            "frame_p99_ms": frame[2],
+            "peak_kib": peak / 1024.0,
+            "phases": stats}
+
+
+def compare(results, baseline, tolerances=TOLERANCES):
+    """Compares results with a baseline
+
+    Args:
+        results: Dict mapping scenario names to run_scenario results
+        baseline: Results of an earlier run in the same form
+        tolerances: Dict of the allowed relative change per metric
+
+    Returns:
+        A list of (scenario, metric, baseline value, value, relative
+        change, True if within tolerance) for every metric compared.
+    """
+    rows = []
+    for name in sorted(set(results) & set(baseline)):
+        for metric, tolerance in sorted(tolerances.items()):
+            old = baseline[name].get(metric)
+            new = results[name].get(metric)
+            if not old or new is None:
+                continue  # e.g. no ticks in a menu
+            change = (new - old) / float(old)
+            if metric in HIGHER_IS_BETTER:
+                ok = change >= -tolerance
+            else:
+                ok = change <= tolerance
+            rows.append((name, metric, old, new, change, ok))
+    return rows
+
+
+def format_results(results):
+    """Returns results as a printable table"""
+    lines = ["%-18s%10s%10s%10s%10s%10s%11s" % (
+        "", "frames/s", "ticks/s", "p50 ms", "p95 ms", "p99 ms", "peak KiB")]
+    for name, r in results.items():
+        lines.append("%-18s%10.0f%10.0f%10.2f%10.2f%10.2f%11.0f" % (
+            name, r["frames_per_sec"], r["ticks_per_sec"], r["frame_p50_ms"],
+            r["frame_p95_ms"], r["frame_p99_ms"], r["peak_kib"]))
+    return "\n".join(lines)
+
+
+def format_comparison(rows):
+    """Returns compare rows as a printable table"""
+    lines = []
+    for name, metric, old, new, change, ok in rows:
+        lines.append("%-18s%-15s%12.2f%12.2f%+9.1f%%  %s" % (
+            name, metric, old, new, change * 100, "ok" if ok else "REGRESSED"))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    names = [name for name, _, _, _ in SCENARIOS]
+    parser.add_argument("-k", "--scenario", action="append", choices=names,
+                        help="run only this scenario (repeatable)")
+    parser.add_argument("--frames", type=float, default=1.0,
+                        help="multiply every scenario's frame count")
+    parser.add_argument("--json", metavar="PATH",
+                        help="write the results as JSON")
+    parser.add_argument("--save-baseline", metavar="PATH",
+                        help="write the results as a baseline")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="compare the results with a saved baseline")
+    parser.add_argument("--tolerance", action="append", default=[],
+                        metavar="METRIC=FRACTION",
+                        help="allowed relative change of a metric, e.g. "
+                        "frame_p95_ms=0.5 (defaults: %s)" % ", ".join(
+                            "%s=%g" % t for t in sorted(TOLERANCES.items())))
+    args = parser.parse_args(argv)
+
+    tolerances = dict(TOLERANCES)
+    for option in args.tolerance:
+        metric, _, value = option.partition("=")
+        if metric not in TOLERANCES:
+            parser.error("unknown metric: " + metric)
+        tolerances[metric] = float(value)
+
+    results = {}
+    for name, setup, frames, warmup in SCENARIOS:
+        if args.scenario and name not in args.scenario:
+            continue
+        results[name] = run_scenario(
+            setup, max(1, int(frames * args.frames)), warmup)
+    print(format_results(results))
+
+    report = {"python": platform.python_version(),
+              "pygame": pygame.version.ver,
+              "machine": platform.machine(),
+              "results": results}
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=1, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        rows = compare(results, baseline, tolerances)
+        print(format_comparison(rows))
+        if not all(row[-1] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Pre-rendered explosion effects
+
+An explosion is a disc growing from the point of impact. ExplosionFrames
+renders the disc once per keyframe, optionally fading out, and looks
+frames up by the age of the effect. EffectLayer draws every effect of a
+frame with one blits call, and falls back to a plain fill once more
+effects are on screen than its budget allows.
+"""
+import pygame
+
+EFFECT_BUDGET = 64  # Effects drawn with sprites per frame
+
+
+class ExplosionFrames(object):
+    """Frames of a disc growing to max_radius over duration
+
+    Attributes:
+        color: Color of the disc
+        max_radius: Radius reached at the end of the effect
+        duration: Length of the effect in milliseconds
+        frames: The pre-rendered surfaces, smallest first
+    """
+
+    def __init__(self, color, max_radius, duration, count=None,
+                 falloff=False):
+        """Inits ExplosionFrames
+
+        Args:
+            color: Color of the disc
+            max_radius: Radius reached at the end of the effect
+            duration: Length of the effect in milliseconds
+            count: Number of frames (default: one per pixel of radius)
+            falloff: Fade the disc out as it grows
+        """
+        self.color = color
+        self.max_radius = max_radius
+        self.duration = duration
+        count = count or max_radius + 1
+        self.frames = []
+        for i in range(count):
+            t = i / float(count - 1)
+            r = int(round(max_radius * t))
+            surf = pygame.Surface((2 * r + 1, 2 * r + 1), pygame.SRCALPHA)
+            if falloff:
+                alpha = int(255 * (1.0 - t))
+            else:
+                alpha = 255
+            pygame.draw.circle(surf, tuple(color[:3]) + (alpha,), (r, r), r)
+            if pygame.display.get_surface() is not None:
+                surf = surf.convert_alpha()
+            self.frames.append(surf)
+
+    def frame(self, age):
+        """Returns the frame age milliseconds into the effect
+
+        Ages past the duration show the last frame.
+        """
+        n = len(self.frames)
+        i = int(age * (n - 1) / float(self.duration))
+        return self.frames[min(max(i, 0), n - 1)]
+
+
+class EffectLayer(object):
+    """Draws many effects of one kind a frame within a budget
+
+    Attributes:
+        frames: The ExplosionFrames drawn
+        budget: Effects drawn with sprites per frame; the rest get a
+            square fill of the disc's color and area
+        drawn: Effects drawn with sprites since the last reset_stats
+        fallbacks: Effects drawn with the fallback since reset_stats
+    """
+
+    def __init__(self, frames, budget=EFFECT_BUDGET):
+        """Inits EffectLayer"""
+        self.frames = frames
+        self.budget = budget
+        self.drawn = 0
+        self.fallbacks = 0
+
+    def draw(self, surface, centers, ages):
+        """Draws one effect per center
+
+        Args:
+            surface: Surface to draw on
+            centers: Sequence of (x, y) centers
+            ages: Milliseconds into each effect
+
+        Returns:
+            A list of the Rects drawn to.
+        """
+        frames = self.frames
+        batch = []
+        rects = []
+        for i, ((x, y), age) in enumerate(zip(centers, ages)):
+            if i < self.budget:
+                f = frames.frame(age)
+                w = f.get_width() // 2
+                batch.append((f, (x - w, y - w)))
+            else:
+                # Over budget: fill a square of the disc's area, which
+                # is much cheaper than blending a sprite
+                t = min(max(age / float(frames.duration), 0.0), 1.0)
+                r = int(frames.max_radius * t * 0.886)
+                rects.append(surface.fill(frames.color,
+                                          (x - r, y - r, 2 * r + 1, 2 * r + 1)))
+        self.drawn += len(batch)
+        self.fallbacks += len(rects)
+        return surface.blits(batch) + rects
+
+    def reset_stats(self):
+        """Zeroes the counters"""
+        self.drawn = self.fallbacks = 0
@@ -0,0 +1,236 @@
+"""Array-backed entity storage for the Meteor Storm simulation
+
+Entities of one kind (asteroids, bolts) are kept as a fixed-capacity
+struct of NumPy arrays so World can move, bounce, cull and expire all of
+them with a few batched operations per tick instead of one Python object
+per entity. Nothing is allocated per spawn, per frame or per death.
+"""
+import numpy as np
+import pygame
+
+
+class Entity(object):
+    """View of one entity inside an EntityStore
+
+    Reads and writes go straight to the store's arrays. Views are pooled
+    by the store, one per slot, and a view describes whichever entity
+    occupies its slot: after the store is compacted it may refer to a
+    different entity.
+
+    Attributes:
+        store: The EntityStore holding the entity
+        index: Index of the entity in the store's arrays
+    """
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        """Inits Entity"""
+        self.store = store
+        self.index = index
+
+    @property
+    def x(self):
+        """Left coordinate"""
+        return int(self.store.x[self.index])
+
+    @x.setter
+    def x(self, value):
+        self.store.x[self.index] = value
+
+    @property
+    def y(self):
+        """Top coordinate"""
+        return int(self.store.y[self.index])
+
+    @y.setter
+    def y(self, value):
+        self.store.y[self.index] = value
+
+    @property
+    def velx(self):
+        """Velocity in the x direction"""
+        return int(self.store.velx[self.index])
+
+    @velx.setter
+    def velx(self, value):
+        self.store.velx[self.index] = value
+
+    @property
+    def vely(self):
+        """Velocity in the y direction"""
+        return int(self.store.vely[self.index])
+
+    @vely.setter
+    def vely(self, value):
+        self.store.vely[self.index] = value
+
+    @property
+    def explode(self):
+        """World time the explosion started, or None when not exploding"""
+        t = self.store.explode[self.index]
+        if t < 0:
+            return None
+        return float(t)
+
+    @explode.setter
+    def explode(self, value):
+        self.store.explode[self.index] = -1 if value is None else value
+
+    @property
+    def sprite(self):
+        """Index of the sprite used to draw the entity"""
+        return int(self.store.sprite[self.index])
+
+    @property
+    def rect(self):
+        """A copy of the entity's bounds as a Rect"""
+        return pygame.Rect(self.x, self.y, self.store.w, self.store.h)
+
+
+class EntityStore(object):
+    """Fixed-capacity struct-of-arrays pool for entities of one size
+
+    Live entities occupy indices [0, count) of every field array. Removal
+    is deferred: kill() clears an entity's alive flag and compact() packs
+    the survivors in one pass, preserving their order. The store is also a
+    sequence of Entity views so callers can iterate it like a list.
+
+    The arrays never grow. When the pool is full, add() refuses the new
+    entity and counts it in dropped; peak and dropped are there to size
+    the capacity.
+
+    Attributes:
+        w: Width of every entity
+        h: Height of every entity
+        capacity: Maximum number of entities
+        count: Number of entities in the store
+        peak: Highest count reached since the last reset_stats()
+        dropped: Entities refused because the pool was full
+        x, y: Top-left positions
+        px, py: Top-left positions at the start of the current tick
+        velx, vely: Velocities in pixels per tick
+        explode: World time each explosion started (-1 when not exploding)
+        sprite: Sprite index of each entity
+        alive: False for entities waiting to be compacted away
+    """
+
+    _FIELDS = (("x", np.int32), ("y", np.int32), ("px", np.int32),
+               ("py", np.int32), ("velx", np.int32),
+               ("vely", np.int32), ("explode", np.float64),
+               ("sprite", np.int16), ("alive", np.bool_))
+
+    def __init__(self, w, h, capacity, view=Entity):
+        """Inits EntityStore
+
+        Args:
+            w: Width of every entity
+            h: Height of every entity
+            capacity: Maximum number of entities
+            view: Entity subclass returned when indexing the store
+        """
+        self.w = w
+        self.h = h
+        self.capacity = capacity
+        self.count = 0
+        self.peak = 0
+        self.dropped = 0
+        for name, dtype in self._FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype))
+        self._views = [view(self, i) for i in range(capacity)]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("entity index out of range")
+        return self._views[i]
+
+    def __iter__(self):
+        return iter(self._views[:self.count])
+
+    def add(self, x, y, velx=0, vely=0, sprite=0):
+        """Appends a new entity
+
+        Returns:
+            The index of the entity, or -1 if the pool is full.
+        """
+        i = self.count
+        if i == self.capacity:
+            self.dropped += 1
+            return -1
+        self.x[i] = x
+        self.y[i] = y
+        self.px[i] = x
+        self.py[i] = y
+        self.velx[i] = velx
+        self.vely[i] = vely
+        self.explode[i] = -1
+        self.sprite[i] = sprite
+        self.alive[i] = True
+        self.count += 1
+        if self.count > self.peak:
+            self.peak = self.count
+        return i
+
+    def snapshot(self):
+        """Records current positions as the start-of-tick positions"""
+        n = self.count
+        self.px[:n] = self.x[:n]
+        self.py[:n] = self.y[:n]
+
+    def lerp(self, alpha):
+        """Returns positions interpolated between the start and end of the
+        current tick
+
+        Args:
+            alpha: 0 for the start of the tick, 1 for the end
+
+        Returns:
+            Tuple of int arrays (x, y)
+        """
+        n = self.count
+        px = self.px[:n]
+        py = self.py[:n]
+        if alpha >= 1:
+            return self.x[:n], self.y[:n]
+        x = px + (self.x[:n] - px) * alpha
+        y = py + (self.y[:n] - py) * alpha
+        return x.astype(np.int32), y.astype(np.int32)
+
+    def kill(self, index):
+        """Marks an entity for removal at the next compact()"""
+        self.alive[index] = False
+
+    def compact(self):
+        """Removes killed entities and returns how many were removed"""
+        n = self.count
+        keep = self.alive[:n].copy()
+        live = int(np.count_nonzero(keep))
+        if live != n:
+            for name, dtype in self._FIELDS:
+                arr = getattr(self, name)
+                arr[:live] = arr[:n][keep]
+            self.count = live
+        return n - live
+
+    def clear(self):
+        """Removes every entity"""
+        self.count = 0
+
+    def occupancy(self):
+        """Returns the fraction of the pool currently in use"""
+        return self.count / float(self.capacity)
+
+    def stats(self):
+        """Returns a dict of pool usage counters"""
+        return {"count": self.count, "capacity": self.capacity,
+                "peak": self.peak, "dropped": self.dropped}
+
+    def reset_stats(self):
+        """Restarts peak and dropped counting from the current state"""
+        self.peak = self.count
+        self.dropped = 0
@@ -0,0 +1,232 @@
+"""NumPy-backed particles for debris and engine trails
+
+Particles live in fixed-capacity struct-of-arrays storage, packed with
+the live particles first like entities.EntityStore. Emitting, moving,
+culling and coloring are vectorized, and drawing writes every particle
+straight into the target surface through pygame.surfarray.pixels2d, so
+the cost per particle is a few array elements rather than Python calls.
+
+Particles are purely visual and use their own random generator, so they
+never affect a World's determinism.
+"""
+import numpy as np
+import pygame
+
+PARTICLE_BUDGET = 20000  # Default capacity
+THIN_ABOVE = 0.75  # Occupancy above which emissions are thinned out
+PARTICLE_CELL = 64  # Side of the grid cells draw reports dirty rects by
+
+
+class ParticleSystem(object):
+    """A pool of point particles
+
+    Each particle has a position, a velocity in pixels per millisecond,
+    an age and lifetime in milliseconds, and a color ramp it moves along
+    as it ages. Emissions into a pool over THIN_ABOVE occupancy keep a
+    random subset proportional to the room left, so effects thin out
+    gracefully instead of cutting off.
+
+    Attributes:
+        capacity: Maximum number of live particles
+        count: Number of live particles
+        x, y, vx, vy, age, life: float32 arrays of length capacity
+        ramp: int16 array of each particle's color ramp
+        size: Side in pixels of the square drawn per particle (1 or 2)
+        cell: Side in pixels of the grid cells draw reports rects by
+        bounds: Rect outside of which particles are culled
+        dropped: Number of particles not emitted for lack of room
+        peak: Highest count reached
+    """
+
+    _FIELDS = ("x", "y", "vx", "vy", "age", "life", "ramp")
+
+    def __init__(self, capacity=PARTICLE_BUDGET, bounds=None, size=2,
+                 seed=None, cell=PARTICLE_CELL):
+        """Inits ParticleSystem
+
+        Args:
+            capacity: Maximum number of live particles
+            bounds: Rect outside of which particles are culled (default:
+                the display surface)
+            size: Side in pixels of the square drawn per particle
+            seed: Seed of the particles' random generator
+            cell: Side in pixels of the grid cells draw reports rects by
+        """
+        self.capacity = capacity
+        self.count = 0
+        for name in self._FIELDS[:-1]:
+            setattr(self, name, np.zeros(capacity, np.float32))
+        self.ramp = np.zeros(capacity, np.int16)
+        self.size = size
+        self.cell = cell
+        if bounds is None:
+            bounds = pygame.display.get_surface().get_rect()
+        self.bounds = pygame.Rect(bounds)
+        self.dropped = 0
+        self.peak = 0
+        self.random = np.random.default_rng(seed)
+        self._ramps = []
+        self._palette = None  # (surface format, mapped ramps)
+
+    def add_ramp(self, colors):
+        """Registers a color ramp
+
+        Args:
+            colors: List of RGB colors a particle goes through from birth
+                to death; every ramp must have the same length
+
+        Returns:
+            The ramp's id, to pass to emit.
+        """
+        if self._ramps and len(colors) != len(self._ramps[0]):
+            raise ValueError("All ramps must have the same length")
+        self._ramps.append([tuple(c) for c in colors])
+        self._palette = None
+        return len(self._ramps) - 1
+
+    def emit(self, x, y, n, ramp, speed=(0.05, 0.2), angle=0.0,
+             spread=2 * np.pi, life=(300, 600)):
+        """Emits n particles from each point
+
+        Args:
+            x, y: Point or arrays of points to emit from
+            n: Particles per point
+            ramp: Color ramp id from add_ramp
+            speed: (min, max) speed in pixels per millisecond
+            angle: Direction in radians; pi / 2 points down the screen
+            spread: Width in radians of the cone of directions
+            life: (min, max) lifetime in milliseconds
+
+        Returns:
+            Number of particles emitted.
+        """
+        x = np.repeat(np.asarray(x, np.float32).reshape(-1), n)
+        y = np.repeat(np.asarray(y, np.float32).reshape(-1), n)
+        total = x.size
+        free = self.capacity - self.count
+        rng = self.random
+
+        # Thin out emissions into a crowded pool, then clip to the room left
+        crowded = self.count - self.capacity * THIN_ABOVE
+        if crowded > 0 and total:
+            keep = rng.random(total) < free / (self.capacity * (1.0 - THIN_ABOVE))
+            x = x[keep]
+            y = y[keep]
+        m = min(x.size, free)
+        self.dropped += total - m
+        if m == 0:
+            return 0
+
+        theta = angle + (rng.random(m, np.float32) - 0.5) * spread
+        v = rng.uniform(speed[0], speed[1], m).astype(np.float32)
+        i = self.count
+        j = i + m
+        self.x[i:j] = x[:m]
+        self.y[i:j] = y[:m]
+        self.vx[i:j] = np.cos(theta) * v
+        self.vy[i:j] = np.sin(theta) * v
+        self.age[i:j] = 0
+        self.life[i:j] = rng.uniform(life[0], life[1], m)
+        self.ramp[i:j] = ramp
+        self.count = j
+        self.peak = max(self.peak, j)
+        return m
+
+    def update(self, dt):
+        """Moves and ages every particle by dt milliseconds, culling the
+        dead and those that left bounds"""
+        n = self.count
+        if not n:
+            return
+        x = self.x[:n]
+        y = self.y[:n]
+        age = self.age[:n]
+        x += self.vx[:n] * dt
+        y += self.vy[:n] * dt
+        age += dt
+
+        b = self.bounds
+        alive = ((age < self.life[:n]) & (x >= b.left) & (x < b.right) &
+                 (y >= b.top) & (y < b.bottom))
+        keep = np.flatnonzero(alive)
+        k = keep.size
+        if k < n:
+            for name in self._FIELDS:
+                arr = getattr(self, name)
+                arr[:k] = arr[keep]
+            self.count = k
+
+    def clear(self):
+        """Removes every particle"""
+        self.count = 0
+
+    def _mapped(self, surface):
+        """Returns the ramps mapped to surface's pixel format"""
+        fmt = (surface.get_bitsize(), surface.get_masks())
+        if self._palette is None or self._palette[0] != fmt:
+            mapped = np.array([[surface.map_rgb(c) for c in ramp]
+                               for ramp in self._ramps], np.uint32)
+            self._palette = (fmt, mapped)
+        return self._palette[1]
+
+    def draw(self, surface):
+        """Writes every particle into surface's pixels
+
+        Args:
+            surface: An 8, 16 or 32 bit surface; the display in practice
+
+        Returns:
+            A list of Rects covering the particles, one per occupied grid
+            cell of side cell, so a spread-out effect doesn't mark the
+            space between its particles as dirty.
+        """
+        n = self.count
+        if not n or not self._ramps:
+            return []
+        w, h = surface.get_size()
+        s = self.size
+        xi = self.x[:n].astype(np.intp)
+        yi = self.y[:n].astype(np.intp)
+        inside = (xi >= 0) & (xi <= w - s) & (yi >= 0) & (yi <= h - s)
+        xi = xi[inside]
+        yi = yi[inside]
+        if not xi.size:
+            return []
+
+        # Color by age along each particle's ramp
+        palette = self._mapped(surface)
+        steps = palette.shape[1]
+        t = self.age[:n][inside] / self.life[:n][inside]
+        k = np.minimum((t * steps).astype(np.intp), steps - 1)
+        colors = palette[self.ramp[:n][inside], k]
+
+        pixels = pygame.surfarray.pixels2d(surface)
+        try:
+            for dx in range(s):
+                for dy in range(s):
+                    pixels[xi + dx, yi + dy] = colors
+        finally:
+            del pixels
+
+        # Bounds of the particles in each cell
+        c = self.cell
+        cols = -(-w // c)
+        cells = (yi // c) * cols + xi // c
+        size = cols * -(-h // c)
+        left = np.full(size, w)
+        top = np.full(size, h)
+        right = np.full(size, -1)
+        bottom = np.full(size, -1)
+        np.minimum.at(left, cells, xi)
+        np.minimum.at(top, cells, yi)
+        np.maximum.at(right, cells, xi)
+        np.maximum.at(bottom, cells, yi)
+        used = np.flatnonzero(right >= 0)
+        return [pygame.Rect(x, y, x1 - x + s, y1 - y + s) for x, y, x1, y1 in
+                zip(left[used].tolist(), top[used].tolist(),
+                    right[used].tolist(), bottom[used].tolist())]
+
+    def stats(self):
+        """Returns a dict of the pool's counters"""
+        return {"count": self.count, "capacity": self.capacity,
+                "peak": self.peak, "dropped": self.dropped}
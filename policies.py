@@ -0,0 +1,160 @@
+"""Input policies for driving a World without a player
+
+A policy looks at a World and returns the INPUT_* bitmask to hold for the
+next tick. Policies are used by the batch runner and anything else that
+plays Meteor Storm headless.
+"""
+import random
+
+import numpy as np
+
+from world import WIDTH, INPUT_LEFT, INPUT_RIGHT, INPUT_FIRE, BOLT_SPEED
+
+
+class ScriptedPolicy(object):
+    """Replays a fixed sequence of inputs, looping at the end
+
+    Attributes:
+        script: Sequence of (ticks, inputs) pairs
+    """
+
+    # Sweep across the screen while firing
+    DEFAULT_SCRIPT = ((12, INPUT_LEFT | INPUT_FIRE),
+                      (24, INPUT_RIGHT | INPUT_FIRE),
+                      (12, INPUT_LEFT | INPUT_FIRE))
+
+    def __init__(self, seed=None, script=DEFAULT_SCRIPT):
+        """Inits ScriptedPolicy
+
+        Args:
+            seed: Unused, accepted so every policy is built the same way
+            script: Sequence of (ticks, inputs) pairs
+        """
+        self.script = script
+        self._inputs = []
+        for ticks, inputs in script:
+            self._inputs.extend([inputs] * ticks)
+        self._i = 0
+
+    def act(self, world):
+        """Returns the inputs for the next tick"""
+        inputs = self._inputs[self._i]
+        self._i = (self._i + 1) % len(self._inputs)
+        return inputs
+
+
+class RandomPolicy(object):
+    """Holds random inputs for random stretches of ticks
+
+    Attributes:
+        random: The policy's random.Random instance
+    """
+
+    _CHOICES = (0, INPUT_LEFT, INPUT_RIGHT, INPUT_FIRE,
+                INPUT_LEFT | INPUT_FIRE, INPUT_RIGHT | INPUT_FIRE)
+
+    def __init__(self, seed=None):
+        """Inits RandomPolicy"""
+        self.random = random.Random(seed)
+        self._inputs = 0
+        self._hold = 0
+
+    def act(self, world):
+        """Returns the inputs for the next tick"""
+        if self._hold == 0:
+            self._inputs = self.random.choice(self._CHOICES)
+            self._hold = self.random.randint(1, 15)
+        self._hold -= 1
+        return self._inputs
+
+
+class DodgePolicy(object):
+    """Dodges falling asteroids and shoots the nearest threat
+
+    Asteroids are extrapolated in a straight line to the player's row.
+    When one is due to land on the player within horizon ticks, the
+    policy steers away from it; otherwise it lines the gun up with the
+    lowest asteroid on screen. It fires whenever it can.
+
+    Attributes:
+        horizon: Ticks of look-ahead when dodging
+        margin: Extra pixels of clearance kept around the player
+    """
+
+    def __init__(self, seed=None, horizon=12, margin=8):
+        """Inits DodgePolicy
+
+        Args:
+            seed: Unused, the policy is deterministic
+            horizon: Ticks of look-ahead when dodging
+            margin: Extra pixels of clearance kept around the player
+        """
+        self.horizon = horizon
+        self.margin = margin
+
+    def act(self, world):
+        """Returns the inputs for the next tick"""
+        roids = world.roids
+        n = roids.count
+        p = world.player.rect
+        if n == 0:
+            return 0
+
+        live = roids.explode[:n] < 0
+        x = roids.x[:n] + roids.w / 2.0
+        y = roids.y[:n]
+        velx = roids.velx[:n]
+        vely = roids.vely[:n]
+
+        # Ticks until each asteroid reaches the player's row
+        gap = p.top - (y + roids.h)
+        t = np.where(vely > 0, gap / np.maximum(vely, 1), np.inf)
+        t = np.maximum(t, 0)
+        landing = x + velx * np.minimum(t, self.horizon)
+        reach = roids.w / 2.0 + p.width / 2.0 + self.margin
+        danger = (live & (t < self.horizon) & (y < p.bottom) &
+                  (np.abs(landing - p.centerx) < reach))
+
+        if danger.any():
+            # Steer away from the average threat, turning back at walls
+            threat = landing[danger].mean()
+            if threat > p.centerx:
+                inputs = INPUT_LEFT if p.centerx > reach else INPUT_RIGHT
+            else:
+                inputs = INPUT_RIGHT if p.centerx < WIDTH - reach else INPUT_LEFT
+            return inputs | INPUT_FIRE
+
+        # Line up with the lowest asteroid still on its way down
+        targets = np.flatnonzero(live & (y < p.top))
+        if targets.size == 0:
+            return INPUT_FIRE
+        i = targets[np.argmax(y[targets])]
+        ticks = max(p.top - y[i], 0) / float(BOLT_SPEED + max(vely[i], 0))
+        aim = x[i] + velx[i] * ticks
+        gun = p.centerx - 13  # Bolts leave left of the player's center
+        if aim < gun - 6:
+            return INPUT_LEFT | INPUT_FIRE
+        if aim > gun + 6:
+            return INPUT_RIGHT | INPUT_FIRE
+        return INPUT_FIRE
+
+
+POLICIES = {
+    "scripted": ScriptedPolicy,
+    "random": RandomPolicy,
+    "dodge": DodgePolicy,
+}
+
+
+def make_policy(name, seed=None):
+    """Builds a policy from its name in POLICIES
+
+    Args:
+        name: Key of the policy in POLICIES
+        seed: Seed for policies that make random choices
+    """
+    try:
+        cls = POLICIES[name]
+    except KeyError:
+        raise ValueError("Unknown policy: " + name)
+    return cls(seed)
@@ -0,0 +1,168 @@
+"""Per-frame phase timings and an in-game overlay to show them
+
+FrameProfiler splits each frame into named phases with lap(): every call
+charges the time since the previous lap to a phase, so a frame's phases
+add up to the whole frame. Finished frames go into a fixed-size ring
+buffer, from which ProfileOverlay draws percentiles per phase, entity
+counts and a frame-time sparkline.
+
+The game only creates a profiler while the overlay is shown or a trace
+is recorded. Code on the hot path holds None otherwise and skips every
+lap with one test.
+"""
+import time
+
+import numpy as np
+import pygame
+
+import textcache
+
+PROFILE_FRAMES = 300  # Frames kept in the ring buffer
+# Phases of a frame in the order they run. The world's phases repeat for
+# every tick run in the frame; "update" is the rest of the state's update
+# and the event loop.
+PHASES = ("input", "spawn", "player_hits", "bolt_hits", "roid_hits",
+          "entities", "draw", "hud", "update", "overlay", "flip", "tick")
+PERCENTILES = (50, 95, 99)
+OVERLAY_REFRESH = 15  # Frames between redraws of the overlay's text
+
+
+class FrameProfiler(object):
+    """Times the phases of every frame into a ring buffer
+
+    Attributes:
+        phases: Names of the timed phases
+        times: float64 array of seconds spent per (frame, phase); rows
+            wrap around once frames rows are filled
+        frames: Number of frames recorded, including overwritten ones
+        trace: Optional object whose complete(name, start, end, args) is
+            called for every lap and frame, e.g. a tracer.TraceWriter
+    """
+
+    def __init__(self, size=PROFILE_FRAMES, phases=PHASES):
+        """Inits FrameProfiler
+
+        Args:
+            size: Number of frames kept
+            phases: Names of the timed phases
+        """
+        self.phases = phases
+        self.times = np.zeros((size, len(phases)))
+        self.frames = 0
+        self.trace = None
+        self._columns = dict((name, i) for i, name in enumerate(phases))
+        self._row = np.zeros(len(phases))
+        self._last = self._frame_start = time.perf_counter()
+
+    def lap(self, phase):
+        """Charges the time since the previous lap to phase"""
+        now = time.perf_counter()
+        self._row[self._columns[phase]] += now - self._last
+        if self.trace:
+            self.trace.complete(phase, self._last, now)
+        self._last = now
+
+    def end_frame(self):
+        """Stores the current frame's timings and starts the next frame"""
+        self.times[self.frames % len(self.times)] = self._row
+        self._row[:] = 0
+        if self.trace:
+            self.trace.complete("frame", self._frame_start, self._last,
+                                {"frame": self.frames})
+        self._frame_start = self._last
+        self.frames += 1
+
+    def recent(self):
+        """Returns the recorded rows, oldest first"""
+        n = len(self.times)
+        if self.frames <= n:
+            return self.times[:self.frames]
+        i = self.frames % n
+        return np.concatenate((self.times[i:], self.times[:i]))
+
+    def percentiles(self, q=PERCENTILES):
+        """Returns per-phase percentiles of the recorded frames
+
+        Returns:
+            A dict mapping each phase, and "frame" for whole frames, to a
+            list of milliseconds, one per entry of q.
+        """
+        rows = self.recent() * 1000.0
+        if not len(rows):
+            return {}
+        table = np.percentile(rows, q, axis=0)
+        result = dict((name, table[:, i].tolist())
+                      for i, name in enumerate(self.phases))
+        result["frame"] = np.percentile(rows.sum(axis=1), q).tolist()
+        return result
+
+
+class ProfileOverlay(object):
+    """Draws a FrameProfiler's statistics over the game
+
+    The text is rebuilt every OVERLAY_REFRESH frames, through the shared
+    textcache, and blitted from a cached surface in between.
+
+    Attributes:
+        profiler: The FrameProfiler shown
+        font: Font of the table
+        pos: Top-left corner of the overlay
+    """
+
+    def __init__(self, profiler, font, pos=(4, 40)):
+        """Inits ProfileOverlay"""
+        self.profiler = profiler
+        self.font = font
+        self.pos = pos
+        self._image = None
+        self._frame = -OVERLAY_REFRESH
+
+    def _render(self, counts):
+        """Renders the table and sparkline onto a new surface"""
+        lines = ["%-11s %6s %6s %6s" % (("ms",) + tuple(
+            "p%d" % q for q in PERCENTILES))]
+        stats = self.profiler.percentiles()
+        for name in self.profiler.phases + ("frame",):
+            if name in stats:
+                lines.append("%-11s %6.2f %6.2f %6.2f" %
+                             ((name,) + tuple(stats[name])))
+        lines.append(", ".join("%s %d" % item for item in counts))
+
+        height = self.font.get_linesize()
+        text = [textcache.render(self.font, line) for line in lines]
+        width = max(t.get_width() for t in text)
+        spark = 40
+        image = pygame.Surface((width + 8, height * len(text) + spark + 12))
+        image.fill((0, 0, 0))
+        image.set_alpha(200)
+        for i, t in enumerate(text):
+            image.blit(t, (4, 4 + i * height))
+
+        # Frame times, newest on the right; the line marks 30 FPS
+        totals = self.profiler.recent().sum(axis=1)[-width:] * 1000.0
+        top = 8 + height * len(text)
+        scale = spark / max(66.7, float(totals.max()) if len(totals) else 0)
+        pygame.draw.line(image, (90, 90, 90), (4, top + spark - 33.3 * scale),
+                         (4 + width, top + spark - 33.3 * scale))
+        if len(totals) > 1:
+            points = [(4 + i, top + spark - t * scale)
+                      for i, t in enumerate(totals.tolist())]
+            pygame.draw.lines(image, (120, 255, 120), False, points)
+        return image
+
+    def draw(self, surface, counts=()):
+        """Draws the overlay
+
+        Args:
+            surface: Surface to draw on
+            counts: (name, count) pairs shown under the table, e.g.
+                [("roids", 12), ("bolts", 3)]
+
+        Returns:
+            The Rect drawn to.
+        """
+        frames = self.profiler.frames
+        if self._image is None or frames - self._frame >= OVERLAY_REFRESH:
+            self._image = self._render(counts)
+            self._frame = frames
+        return surface.blit(self._image, self.pos)
@@ -0,0 +1,115 @@
+"""Dirty-rectangle rendering for Meteor Storm
+
+During gameplay only the entities, the score label and the hearts change
+from one frame to the next. DirtyRenderer erases the areas drawn on the
+previous frame from the background, lets the caller redraw, and pushes
+only the changed areas to the display. Frames that change too much of
+the screen fall back to a full flip.
+"""
+import pygame
+
+DIRTY_THRESHOLD = 0.5  # Fraction of the screen above which we flip
+MAX_DIRTY_RECTS = 64  # Rect count above which we flip
+
+
+def merge_rects(rects):
+    """Merges overlapping or touching rects
+
+    Args:
+        rects: Iterable of Rects
+
+    Returns:
+        A list of pairwise disjoint Rects covering the input.
+    """
+    merged = []
+    for r in sorted((pygame.Rect(r) for r in rects if r.w and r.h),
+                    key=lambda r: r.x):
+        # Absorb every merged rect it touches, then repeat with the union
+        grown = True
+        while grown:
+            grown = False
+            i = r.inflate(2, 2).collidelist(merged)
+            if i != -1:
+                r.union_ip(merged.pop(i))
+                grown = True
+        merged.append(r)
+    return merged
+
+
+class DirtyRenderer(object):
+    """Redraws and presents only the changed parts of the screen
+
+    Each frame: begin() erases last frame's drawing from the background,
+    the caller draws and reports the rects it touched with add(), then
+    present() updates the display. invalidate() makes the next frame a
+    full redraw, e.g. after another state drew over the screen.
+
+    Attributes:
+        surface: The display surface
+        background: Surface the screen is erased to
+        threshold: Fraction of the screen above which present() flips
+        max_rects: Rect count above which present() flips
+        drawing: True between begin() and present()
+        full_frames: Number of frames presented with a full flip
+        dirty_frames: Number of frames presented with dirty rects
+    """
+
+    def __init__(self, surface, background, threshold=DIRTY_THRESHOLD,
+                 max_rects=MAX_DIRTY_RECTS):
+        """Inits DirtyRenderer"""
+        self.surface = surface
+        self.background = background
+        self.threshold = threshold
+        self.max_rects = max_rects
+        self.drawing = False
+        self.full_frames = 0
+        self.dirty_frames = 0
+        self._area = surface.get_width() * surface.get_height()
+        self._prev = None  # None forces a full redraw
+        self._rects = []
+        self._erased = []
+
+    def invalidate(self):
+        """Makes the next frame a full redraw"""
+        self._prev = None
+
+    def begin(self):
+        """Starts a frame by erasing what the previous frame drew"""
+        self.drawing = True
+        self._rects = []
+        if self._prev is None:
+            self.surface.blit(self.background, (0, 0))
+            self._erased = None
+        else:
+            self._erased = merge_rects(self._prev)
+            for r in self._erased:
+                self.surface.blit(self.background, r, r)
+
+    def add(self, rects):
+        """Records areas drawn this frame
+
+        Args:
+            rects: A Rect or a list of Rects
+        """
+        if isinstance(rects, pygame.Rect):
+            self._rects.append(rects)
+        else:
+            self._rects.extend(rects)
+
+    def present(self):
+        """Pushes the frame to the display"""
+        self.drawing = False
+        drawn = self._rects
+        if self._erased is None:
+            pygame.display.flip()
+            self.full_frames += 1
+        else:
+            dirty = merge_rects(self._erased + drawn)
+            area = sum(r.w * r.h for r in dirty)
+            if len(dirty) > self.max_rects or area > self.threshold * self._area:
+                pygame.display.flip()
+                self.full_frames += 1
+            else:
+                pygame.display.update(dirty)
+                self.dirty_frames += 1
+        self._prev = drawn
@@ -0,0 +1,300 @@
+"""Compact binary replays of Meteor Storm games
+
+A replay holds the World seed and starting difficulty, the INPUT_*
+bitmask of every tick as run-length encoded runs, and a World.checksum
+every few ticks. Re-simulating the inputs from the seed must reproduce
+every checksum, which makes replays a regression test for the rules.
+
+File layout (integers are unsigned LEB128 varints unless noted):
+    b"MSRP", version byte
+    seed, base_roidrate, max_x, min_y, max_y (zigzag encoded)
+    checksum interval, tick count
+    run count, then (inputs byte, run length) per run
+    checksum count, then one little-endian uint32 per checksum
+
+Usage:
+    python replay.py verify FILE...
+    python replay.py play FILE [--speed N]
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from world import TICK_MS, World
+
+MAGIC = b"MSRP"
+VERSION = 1
+CHECKSUM_INTERVAL = 30  # Ticks between checksums
+
+
+class ReplayError(Exception):
+    """Raised for malformed replay files"""
+
+
+def _write_varint(out, value):
+    """Appends an unsigned LEB128 varint to a bytearray"""
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(data, pos):
+    """Reads an unsigned LEB128 varint
+
+    Returns:
+        Tuple (value, position after the varint).
+    """
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ReplayError("Truncated replay")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _zigzag(value):
+    """Maps signed integers onto unsigned ones for varint encoding"""
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value):
+    """Inverse of _zigzag"""
+    return value // 2 if not value & 1 else -(value + 1) // 2
+
+
+class Replay(object):
+    """A recorded game
+
+    Attributes:
+        seed: Seed of the recorded World
+        params: Dict of World keyword arguments (starting difficulty)
+        interval: Ticks between checksums
+        runs: List of [inputs, run length] pairs
+        checksums: World.checksum after every interval-th tick
+    """
+
+    PARAMS = ("base_roidrate", "max_x", "min_y", "max_y")
+
+    def __init__(self, seed, params, interval=CHECKSUM_INTERVAL):
+        """Inits an empty Replay"""
+        self.seed = seed
+        self.params = params
+        self.interval = interval
+        self.runs = []
+        self.checksums = []
+
+    @property
+    def ticks(self):
+        """Number of recorded ticks"""
+        return sum(n for _, n in self.runs)
+
+    def inputs(self):
+        """Yields the inputs of every tick in order"""
+        for inputs, n in self.runs:
+            for _ in range(n):
+                yield inputs
+
+    def new_world(self):
+        """Returns a World in the recorded starting state"""
+        return World(self.seed, **self.params)
+
+    def to_bytes(self):
+        """Encodes the replay"""
+        out = bytearray(MAGIC)
+        out.append(VERSION)
+        _write_varint(out, self.seed)
+        for name in self.PARAMS:
+            _write_varint(out, _zigzag(int(self.params[name])))
+        _write_varint(out, self.interval)
+        _write_varint(out, self.ticks)
+        _write_varint(out, len(self.runs))
+        for inputs, n in self.runs:
+            out.append(inputs)
+            _write_varint(out, n)
+        _write_varint(out, len(self.checksums))
+        for crc in self.checksums:
+            out += struct.pack("<I", crc)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Decodes a replay written by to_bytes"""
+        if data[:4] != MAGIC:
+            raise ReplayError("Not a Meteor Storm replay")
+        if data[4] != VERSION:
+            raise ReplayError("Unsupported replay version: %d" % data[4])
+        pos = 5
+        seed, pos = _read_varint(data, pos)
+        params = {}
+        for name in cls.PARAMS:
+            value, pos = _read_varint(data, pos)
+            params[name] = _unzigzag(value)
+        interval, pos = _read_varint(data, pos)
+        replay = cls(seed, params, interval)
+
+        ticks, pos = _read_varint(data, pos)
+        count, pos = _read_varint(data, pos)
+        for _ in range(count):
+            if pos >= len(data):
+                raise ReplayError("Truncated replay")
+            inputs = data[pos]
+            n, pos = _read_varint(data, pos + 1)
+            replay.runs.append([inputs, n])
+        if replay.ticks != ticks:
+            raise ReplayError("Tick count does not match the inputs")
+
+        count, pos = _read_varint(data, pos)
+        if len(data) < pos + 4 * count:
+            raise ReplayError("Truncated replay")
+        replay.checksums = list(struct.unpack_from("<%dI" % count, data, pos))
+        return replay
+
+    def save(self, path):
+        """Writes the replay to a file"""
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        """Reads a replay from a file"""
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+class ReplayRecorder(object):
+    """Records the inputs of a World as it is stepped
+
+    Attach it as FixedStepper.recorder, or call record after every
+    World.step.
+
+    Attributes:
+        world: The recorded World, which must not have been stepped yet
+        replay: The Replay being filled in
+    """
+
+    def __init__(self, world, interval=CHECKSUM_INTERVAL):
+        """Inits ReplayRecorder"""
+        self.world = world
+        params = dict((name, getattr(world, name)) for name in Replay.PARAMS)
+        self.replay = Replay(world.seed, params, interval)
+
+    def record(self, inputs):
+        """Records the inputs of the tick the world just ran"""
+        runs = self.replay.runs
+        if runs and runs[-1][0] == inputs:
+            runs[-1][1] += 1
+        else:
+            runs.append([inputs, 1])
+        if self.world.ticks % self.replay.interval == 0:
+            self.replay.checksums.append(self.world.checksum())
+
+
+def verify(replay):
+    """Re-simulates a replay headless as fast as possible
+
+    Returns:
+        Tuple (ok, tick): ok is False when a checksum differs, and tick
+        is the tick of the first mismatch (or the number of ticks played).
+    """
+    world = replay.new_world()
+    checksums = replay.checksums
+    interval = replay.interval
+    k = 0
+    for inputs in replay.inputs():
+        world.step(inputs)
+        if world.ticks % interval == 0:
+            if k >= len(checksums) or world.checksum() != checksums[k]:
+                return False, world.ticks
+            k += 1
+    return k == len(checksums), world.ticks
+
+
+def play(replay, speed=1.0):
+    """Shows a replay in a window at speed times real time
+
+    Checksums are verified as the replay plays.
+
+    Returns:
+        Same as verify.
+    """
+    import pygame
+    import asteroids
+
+    world = replay.new_world()
+    checksums = replay.checksums
+    interval = replay.interval
+    inputs = replay.inputs()
+    clock = pygame.time.Clock()
+    accumulator = 0.0
+    k = 0
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return k == len(checksums), world.ticks
+
+        accumulator += clock.tick(asteroids.FPS) * speed
+        while accumulator >= TICK_MS:
+            accumulator -= TICK_MS
+            try:
+                world.step(next(inputs))
+            except StopIteration:
+                return k == len(checksums), world.ticks
+            if world.ticks % interval == 0:
+                if k >= len(checksums) or world.checksum() != checksums[k]:
+                    return False, world.ticks
+                k += 1
+
+        asteroids.screen.blit(asteroids.backgroundObj, (0, 0))
+        asteroids.draw_world(world, min(accumulator / TICK_MS, 1.0))
+        pygame.display.flip()
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Meteor Storm replays")
+    sub = parser.add_subparsers(dest="command")
+    sub.required = True
+    p = sub.add_parser("verify", help="re-simulate replays headless")
+    p.add_argument("files", nargs="+")
+    p = sub.add_parser("play", help="show a replay in a window")
+    p.add_argument("file")
+    p.add_argument("--speed", type=float, default=1.0,
+                   help="playback speed relative to real time")
+    args = parser.parse_args(argv)
+
+    if args.command == "play":
+        ok, tick = play(Replay.load(args.file), args.speed)
+        print("%s: %s at tick %d" % (args.file, "ok" if ok else "MISMATCH", tick))
+        return 0 if ok else 1
+
+    failed = 0
+    ticks = 0
+    start = time.perf_counter()
+    for path in args.files:
+        ok, tick = verify(Replay.load(path))
+        ticks += tick
+        if not ok:
+            failed += 1
+            print("%s: MISMATCH at tick %d" % (path, tick))
+    seconds = time.perf_counter() - start
+    print("%d replays, %d failed, %d ticks in %.2f s" %
+          (len(args.files), failed, ticks, seconds))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,391 @@
+"""Soak test: an autopilot plays and navigates Meteor Storm for hours
+
+Autopilot drives a GameManager through the same paths a player does. In
+game, a DodgePolicy is PlayingState's input policy, held along with the
+keyboard. Menu buttons are hovered and clicked through a Pointer that
+stands in for pygame.mouse, and Escape, Return and the name typed when
+saving a score are posted as KEYDOWN events. It loops through every
+state:
+
+    MAINMENU -> LEADERBOARD -> MAINMENU -> PLAYING
+    PLAYING -> GAMEOVER -> SAVESCORE -> LEADERBOARD -> GAMEOVER -> PLAYING
+    PLAYING -> PAUSED -> PLAYING, or -> MAINMENU and round again
+
+The main loop runs uncapped on bench.FixedClock, one simulation tick per
+frame. Every interval a line is logged with the interval's frame-time
+percentiles and the drift of its median from the first interval's, the
+process's memory and the size of the scores file. Scores are saved to a
+copy of the leader board, not to the player's.
+
+Usage:
+    python soak.py --hours 4 --log soak.log
+    python soak.py --hours 0.1 --interval 10 --audit
+"""
+import argparse
+import gc
+import os
+import shutil
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+from pygame.locals import (QUIT, KEYDOWN, K_ESCAPE, K_RETURN, K_a, K_k,
+                           K_o, K_s)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import asteroids
+from audit import LifecycleAuditor
+from bench import FixedClock
+from policies import DodgePolicy
+from world import TICK_RATE
+
+SOAK_SCORES = "soak_scores.txt"
+SOAK_NAME = (K_s, K_o, K_a, K_k)  # Typed when saving a score
+LOG_INTERVAL = 60.0  # Seconds between log lines
+FRAME_SAMPLES = 1 << 16  # Latest frame times kept per interval
+GAME_TICKS = 5 * 60 * TICK_RATE  # Games still running are ended here
+PAUSE_TICK = 10 * TICK_RATE  # Tick of a game at which it is paused
+PAUSE_EVERY = 2  # Games between pauses
+SAVE_EVERY = 2  # Games between saved scores
+OFF_SCREEN = (-1, -1)
+
+
+class Pointer(object):
+    """Stands in for pygame.mouse as GameManager.mouse
+
+    Attributes:
+        pos: Position returned by get_pos()
+        pressed: Flag returned for the left button by get_pressed()
+    """
+
+    def __init__(self):
+        """Inits Pointer"""
+        self.pos = OFF_SCREEN
+        self.pressed = False
+
+    def get_pos(self):
+        """Returns the pointer's position"""
+        return self.pos
+
+    def get_pressed(self):
+        """Returns the state of the (left, middle, right) buttons"""
+        return self.pressed, False, False
+
+
+class Autopilot(object):
+    """Plays a GameManager and clicks through its menus
+
+    Call frame() before every manager.update().
+
+    Attributes:
+        manager: The driven GameManager
+        pointer: Pointer installed as manager.mouse
+        policy: DodgePolicy installed as the playing state's policy
+        game_ticks: Ticks after which a game is ended with Return
+        games: Number of games that reached the game over screen
+        visits: Dict counting the entries into each state by name
+    """
+
+    def __init__(self, manager, game_ticks=GAME_TICKS):
+        """Inits Autopilot and takes over the manager's inputs"""
+        self.manager = manager
+        self.pointer = Pointer()
+        self.policy = DodgePolicy()
+        self.game_ticks = game_ticks
+        self.games = 0
+        self.visits = {}
+        self._state = None
+        self._target = None  # (panel, button) to click
+        self._paused = False  # The current game was paused
+        self._pauses = 0
+        self._board = False  # The main menu showed the leader board
+        manager.mouse = self.pointer
+        manager.playingstate.policy = self.policy
+
+    @staticmethod
+    def _keys(keys):
+        """Posts a KEYDOWN event per key"""
+        for key in keys:
+            pygame.event.post(pygame.event.Event(KEYDOWN, key=key))
+
+    def _choose(self, state):
+        """Returns the (panel, button) to click in a state just entered"""
+        m = self.manager
+        if state is m.mainmenustate:
+            self._board = not self._board
+            return state.menu, (state.btn_lead if self._board
+                                else state.btn_play)
+        if state is m.leaderboardstate:
+            return state.view, state.btn_back
+        if state is m.savescorestate:
+            if not state.input.get_text():
+                self._keys(SOAK_NAME)
+            return state.view, state.btn_save
+        if state is m.pausestate:
+            self._pauses += 1
+            return state.view, (state.btn_resume if self._pauses % 2
+                                else state.btn_mainmenu)
+        if state is m.gameoverstate:
+            if state.prev is m.leaderboardstate:
+                # Back from the saved score
+                return state.view, state.btn_restart
+            self.games += 1
+            self._paused = False
+            return state.view, (state.btn_save if self.games % SAVE_EVERY == 0
+                                else state.btn_restart)
+        return None
+
+    def _click(self, panel, button):
+        """Moves the pointer onto button, pressing it once it hovers"""
+        rect = panel.button_rect(button)
+        if rect is None:
+            return
+        if self.pointer.pos != rect.center:
+            self.pointer.pos = rect.center
+            self.pointer.pressed = False
+        else:
+            self.pointer.pressed = True
+
+    def _play(self):
+        """Pauses or ends the game through the keyboard events"""
+        ticks = self.manager.world.ticks
+        if ticks >= self.game_ticks:
+            self._keys((K_RETURN,))
+        elif (not self._paused and ticks >= PAUSE_TICK and
+              self.games % PAUSE_EVERY == 0):
+            self._paused = True
+            self._keys((K_ESCAPE,))
+
+    def frame(self):
+        """Sets the inputs for the next update"""
+        m = self.manager
+        # noinspection PyProtectedMember
+        state = m._state
+        if state is not self._state:
+            self._state = state
+            self.visits[state.name] = self.visits.get(state.name, 0) + 1
+            self.pointer.pos = OFF_SCREEN
+            self.pointer.pressed = False
+            self._target = self._choose(state)
+
+        if not state.active or getattr(state, "leaving", False):
+            return
+        if state is m.playingstate:
+            self._play()
+        elif state is m.savescorestate and not state.input.get_text():
+            return  # The name is still being typed
+        elif self._target:
+            self._click(*self._target)
+
+
+def rss_mib():
+    """Returns the resident set size in MiB
+
+    Falls back to the peak resident set size where the current one isn't
+    available, and NaN where neither is.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1048576.0
+    except (IOError, OSError, ValueError, AttributeError):
+        pass
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1048576.0 if sys.platform == "darwin" else 1024.0)
+
+
+class SoakLog(object):
+    """Logs frame times, memory and the scores file size over time
+
+    Attributes:
+        path: The scores file whose size is logged
+        out: Files every line is written to
+        first_p50: Median frame time of the first interval in ms, the
+            reference for the drift
+        rows: List of one dict per logged interval
+    """
+
+    HEADER = ("%8s %9s %7s %6s %7s %7s %7s %7s %8s %8s %8s %9s" % (
+        "elapsed", "frames", "fps", "games", "p50 ms", "p99 ms", "max ms",
+        "drift", "rss MiB", "traced", "objects", "scores B"))
+
+    def __init__(self, path, out):
+        """Inits SoakLog
+
+        Args:
+            path: The scores file whose size is logged
+            out: Files to write the lines to
+        """
+        self.path = path
+        self.out = out
+        self.first_p50 = None
+        self.rows = []
+        self._write(self.HEADER)
+
+    def _write(self, line):
+        """Writes a line to every output"""
+        for f in self.out:
+            f.write(line + "\n")
+            f.flush()
+
+    def log(self, elapsed, frames, games, times):
+        """Logs one interval
+
+        Args:
+            elapsed: Seconds since the start
+            frames: Frames run since the start
+            games: Games played since the start
+            times: Frame times of the interval in seconds, or the latest
+                FRAME_SAMPLES of them
+        """
+        ms = np.asarray(times) * 1000.0
+        p50, p99 = np.percentile(ms, (50, 99)).tolist()
+        if self.first_p50 is None:
+            self.first_p50 = p50
+        traced = (tracemalloc.get_traced_memory()[0] / 1048576.0
+                  if tracemalloc.is_tracing() else float("nan"))
+        row = {"elapsed": elapsed, "frames": frames, "games": games,
+               "fps": len(ms) / (ms.sum() / 1000.0), "p50_ms": p50,
+               "p99_ms": p99, "max_ms": float(ms.max()),
+               "drift": p50 / self.first_p50 - 1.0, "rss_mib": rss_mib(),
+               "traced_mib": traced, "objects": len(gc.get_objects()),
+               "scores_bytes": os.path.getsize(self.path)}
+        self.rows.append(row)
+        hours, rest = divmod(int(elapsed), 3600)
+        self._write("%2d:%02d:%02d %9d %7.0f %6d %7.2f %7.2f %7.2f %+6.1f%% "
+                    "%8.1f %8.1f %8d %9d" % (
+                        hours, rest // 60, rest % 60, frames, row["fps"],
+                        games, p50, p99, row["max_ms"], row["drift"] * 100,
+                        row["rss_mib"], traced, row["objects"],
+                        row["scores_bytes"]))
+
+
+def soak(manager, autopilot, log, seconds=None, interval=LOG_INTERVAL):
+    """Runs the main loop uncapped until seconds passed or the window closed
+
+    Args:
+        manager: The GameManager
+        autopilot: Autopilot driving manager
+        log: SoakLog written every interval
+        seconds: Seconds to run for, or None to run until interrupted
+        interval: Seconds between log lines
+    """
+    start = last = time.perf_counter()
+    next_log = start + interval
+    frames = 0
+    # A fixed ring buffer, so that the soak itself doesn't grow under --audit
+    times = np.empty(FRAME_SAMPLES)
+    sampled = 0
+    played = False
+    auditor = manager.auditor
+    audits = auditor and len(auditor.games)
+    try:
+        while seconds is None or last - start < seconds:
+            autopilot.frame()
+            manager.update()
+            if pygame.event.get(QUIT):
+                break
+            pygame.event.get()
+            manager.present()
+            manager.end_frame()
+
+            now = time.perf_counter()
+            if auditor and len(auditor.games) != audits:
+                # Leave out the frame of the auditor's collection and snapshot
+                audits = len(auditor.games)
+            elif not played:
+                # The opening and main menu fades last a fixed real time, so
+                # their cheap frames would skew the first interval's median
+                played = manager.world.ticks > 0
+            else:
+                times[sampled % FRAME_SAMPLES] = now - last
+                sampled += 1
+            last = now
+            frames += 1
+            if now >= next_log and sampled:
+                log.log(now - start, frames, autopilot.games,
+                        times[:min(sampled, FRAME_SAMPLES)])
+                sampled = 0
+                next_log += interval
+    except KeyboardInterrupt:
+        pass
+    if sampled and not log.rows:
+        # A partial interval would skew the drift of a longer run
+        log.log(last - start, frames, autopilot.games,
+                times[:min(sampled, FRAME_SAMPLES)])
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=float,
+                        help="stop after this long (default: run until "
+                        "interrupted)")
+    parser.add_argument("--interval", type=float, default=LOG_INTERVAL,
+                        metavar="SECONDS",
+                        help="seconds between log lines (default: %g)"
+                        % LOG_INTERVAL)
+    parser.add_argument("--log", metavar="FILE",
+                        help="also write the log to FILE")
+    parser.add_argument("--scores", default=SOAK_SCORES, metavar="FILE",
+                        help="scores file, copied from %s if missing "
+                        "(default: %s)" % (asteroids.SCORES_FILE, SOAK_SCORES))
+    parser.add_argument("--game-ticks", type=int, default=GAME_TICKS,
+                        metavar="N",
+                        help="end games still running after N ticks "
+                        "(default: %d)" % GAME_TICKS)
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="only redraw changed areas during gameplay")
+    parser.add_argument("--starfield", action="store_true",
+                        help="scroll a procedural starfield behind gameplay "
+                        "(static with --dirty-rects)")
+    parser.add_argument("--particles", type=int,
+                        default=asteroids.PARTICLE_BUDGET, metavar="N",
+                        help="particle budget, 0 to disable")
+    parser.add_argument("--audit", action="store_true",
+                        help="check every game for leaks with audit.py and "
+                        "log traced memory (tracemalloc slows frames down "
+                        "many times over)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.scores):
+        shutil.copyfile(asteroids.SCORES_FILE, args.scores)
+    asteroids.fpsClock = FixedClock()
+    manager = asteroids.GameManager(
+        dirty_rects=args.dirty_rects, particle_budget=args.particles,
+        starfield=args.starfield, scores_path=args.scores)
+    autopilot = Autopilot(manager, args.game_ticks)
+    if args.audit:
+        # The soak's own log is left out of the snapshots
+        manager.auditor = LifecycleAuditor(manager, ignore=[__file__])
+
+    out = [sys.stdout]
+    if args.log:
+        out.append(open(args.log, 'a'))
+    log = SoakLog(args.scores, out)
+    soak(manager, autopilot, log,
+         args.hours * 3600 if args.hours is not None else None,
+         args.interval)
+
+    print("visits: " + ", ".join(
+        "%s %d" % item for item in sorted(autopilot.visits.items())))
+    if manager.auditor:
+        print(manager.auditor.format_report())
+    for f in out[1:]:
+        f.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Procedural parallax starfield background
+
+Stars of every layer live in one set of NumPy arrays. A layer scrolls as
+a whole, so a step only advances one offset per layer; drawing clears the
+target with a blit of empty space and writes every star into it through
+pygame.surfarray.pixels2d, with no Python call per star. Far layers are
+dim and slow, near layers bright and fast.
+
+render draws the stars once onto a separate surface, which can serve as
+a static background layer, e.g. for a DirtyRenderer.
+"""
+import numpy as np
+import pygame
+
+# (number of stars, speed in pixels per millisecond, color) far to near
+STAR_LAYERS = ((7000, 0.004, (60, 60, 80)),
+               (3000, 0.012, (130, 130, 155)),
+               (800, 0.035, (235, 235, 255)))
+SPACE_COLOR = (6, 6, 16)
+
+
+class Starfield(object):
+    """A vertically scrolling multi-layer starfield
+
+    Attributes:
+        size: (width, height) of the field
+        color: Color of empty space
+        x, y: int32 arrays of star positions before scrolling
+        layer: int16 array of each star's layer
+        speed: float64 array of each layer's speed in pixels per
+            millisecond
+        offset: float64 array of how far each layer has scrolled
+    """
+
+    def __init__(self, size, layers=STAR_LAYERS, color=SPACE_COLOR,
+                 seed=None):
+        """Inits Starfield
+
+        Args:
+            size: (width, height) of the field
+            layers: Sequence of (stars, speed, color), far to near
+            color: Color of empty space
+            seed: Seed for the star positions
+        """
+        self.size = size
+        self.color = color
+        self._colors = [c for _, _, c in layers]
+        counts = [n for n, _, _ in layers]
+        ends = np.cumsum(counts)
+        self._slices = [slice(e - n, e) for n, e in zip(counts, ends)]
+
+        rng = np.random.default_rng(seed)
+        w, h = size
+        x = rng.integers(0, w, ends[-1], np.int32)
+        y = rng.integers(0, h, ends[-1], np.int32)
+        self.layer = np.repeat(np.arange(len(layers), dtype=np.int16), counts)
+        # Row order within each layer keeps the pixel writes close together
+        order = np.lexsort((x, y, self.layer))
+        self.x = x[order]
+        self.y = y[order]
+        self.speed = np.array([s for _, s, _ in layers], np.float64)
+        self.offset = np.zeros(len(layers), np.float64)
+        self._yi = np.empty_like(self.y)
+        self._palette = None  # (surface format, color of each star)
+        self._blank = None
+
+    def __len__(self):
+        return self.x.size
+
+    def step(self, dt):
+        """Scrolls the layers by dt milliseconds"""
+        self.offset += self.speed * dt
+        np.mod(self.offset, self.size[1], out=self.offset)
+
+    def _mapped(self, surface):
+        """Returns each star's color mapped to surface's pixel format"""
+        fmt = (surface.get_bitsize(), surface.get_masks())
+        if self._palette is None or self._palette[0] != fmt:
+            mapped = np.array([surface.map_rgb(c) for c in self._colors],
+                              np.uint32)
+            self._palette = (fmt, mapped[self.layer])
+            self._blank = None
+        return self._palette[1]
+
+    def draw(self, surface):
+        """Clears surface to space and writes every star into it
+
+        Args:
+            surface: An 8, 16 or 32 bit surface of at least size
+
+        Returns:
+            The Rect drawn to.
+        """
+        colors = self._mapped(surface)
+        if self._blank is None:
+            # Blitting empty space takes 0.06 ms at 375x600, filling with
+            # it 0.33 ms
+            self._blank = pygame.Surface(self.size, 0, surface)
+            self._blank.fill(self.color)
+        rect = surface.blit(self._blank, (0, 0))
+
+        h = self.size[1]
+        yi = self._yi
+        for i, s in enumerate(self._slices):
+            np.add(self.y[s], int(self.offset[i]), out=yi[s])
+        np.subtract(yi, h, out=yi, where=yi >= h)
+        pixels = pygame.surfarray.pixels2d(surface)
+        try:
+            pixels[self.x, yi] = colors
+        finally:
+            del pixels
+        return rect
+
+    def render(self):
+        """Returns a new surface in the display format with the stars
+        drawn at their current offsets
+        """
+        surface = pygame.Surface(self.size)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()
+        self.draw(surface)
+        return surface
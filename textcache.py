@@ -0,0 +1,144 @@
+"""Cached text rendering for Meteor Storm
+
+Font.render is one of the slowest calls in pygame, and most of the text
+on screen never changes. render() keeps recently rendered text in a
+bounded LRU cache shared by every font. GlyphAtlas draws numbers, like
+the score, from pre-rendered digits so a changing number does not
+re-rasterize anything.
+
+Cached surfaces are shared between callers and must not be drawn on.
+"""
+from collections import OrderedDict
+
+import pygame
+
+TEXT_CACHE_SIZE = 256  # Rendered strings kept by the shared cache
+DIGITS = "0123456789"
+
+
+class TextCache(object):
+    """LRU cache of rendered text keyed on (font, text, antialias, color)
+
+    Attributes:
+        maxsize: Number of surfaces kept before the least recently used
+            one is dropped
+        hits: Number of renders served from the cache
+        misses: Number of renders that called Font.render
+        evictions: Number of surfaces dropped to make room
+    """
+
+    def __init__(self, maxsize=TEXT_CACHE_SIZE):
+        """Inits TextCache"""
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._surfaces = OrderedDict()
+
+    def __len__(self):
+        return len(self._surfaces)
+
+    def render(self, font, text, antialias, color):
+        """Same as font.render(text, antialias, color), but cached"""
+        key = (font, text, antialias, tuple(color))
+        surf = self._surfaces.get(key)
+        if surf is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surf
+
+        self.misses += 1
+        surf = font.render(text, antialias, color)
+        self._surfaces[key] = surf
+        if len(self._surfaces) > self.maxsize:
+            self._surfaces.popitem(last=False)
+            self.evictions += 1
+        return surf
+
+    def clear(self):
+        """Drops every cached surface"""
+        self._surfaces.clear()
+
+    def stats(self):
+        """Returns a dict of the cache's size and counters"""
+        lookups = self.hits + self.misses
+        return {"size": len(self._surfaces),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / float(lookups) if lookups else 0.0}
+
+    def reset_stats(self):
+        """Zeroes the counters"""
+        self.hits = self.misses = self.evictions = 0
+
+
+# The cache shared by all fonts
+cache = TextCache()
+
+
+def render(font, text, antialias=True, color=(255, 255, 255)):
+    """Renders text through the shared cache"""
+    return cache.render(font, text, antialias, color)
+
+
+class GlyphAtlas(object):
+    """Draws strings from a fixed set of pre-rendered glyphs
+
+    All glyphs are packed side by side on one surface; drawing a string
+    blits one area of the atlas per character.
+
+    Attributes:
+        font: Font the glyphs were rendered with
+        chars: The characters in the atlas
+        surface: The atlas
+        height: Height of every glyph
+    """
+
+    def __init__(self, font, color=(255, 255, 255), antialias=True,
+                 chars=DIGITS):
+        """Inits GlyphAtlas
+
+        Args:
+            font: Font to render the glyphs with
+            color: Glyph color
+            antialias: Render smooth glyphs
+            chars: Characters to put in the atlas
+        """
+        self.font = font
+        self.chars = chars
+        glyphs = [font.render(c, antialias, color) for c in chars]
+        self.height = max(g.get_height() for g in glyphs)
+
+        self.surface = pygame.Surface(
+            (sum(g.get_width() for g in glyphs), self.height),
+            pygame.SRCALPHA)
+        self._areas = {}
+        x = 0
+        for c, g in zip(chars, glyphs):
+            # Copy, don't blend, the glyph onto the transparent atlas
+            self.surface.blit(g, (x, 0), special_flags=pygame.BLEND_RGBA_MAX)
+            self._areas[c] = pygame.Rect(x, 0, g.get_width(), g.get_height())
+            x += g.get_width()
+
+    def draw(self, surface, text, pos):
+        """Draws text, which may only use the atlas' characters
+
+        Args:
+            surface: Surface to draw on
+            text: String to draw
+            pos: Top-left corner to draw at
+
+        Returns:
+            The Rect drawn to.
+        """
+        x, y = pos
+        drawn = pygame.Rect(x, y, 0, self.height)
+        areas = self._areas
+        for c in text:
+            area = areas[c]
+            surface.blit(self.surface, (x, y), area)
+            x += area.w
+        drawn.w = x - drawn.x
+        return drawn
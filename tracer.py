@@ -0,0 +1,126 @@
+"""Chrome trace-event export of frames and state changes
+
+TraceWriter streams events in the Chrome trace-event JSON format, which
+chrome://tracing and ui.perfetto.dev load directly. The game thread only
+appends small tuples to a batch; batches are handed to a background
+thread that encodes and writes them. The hand-off queue is bounded, and
+when the writer falls behind whole batches are dropped and counted
+instead of stalling a frame.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+TRACE_BATCH = 1024  # Events per batch handed to the writer thread
+TRACE_PENDING = 32  # Batches queued before new ones are dropped
+
+
+class TraceWriter(object):
+    """Writes trace events to a file from a background thread
+
+    Times are time.perf_counter() seconds, like FrameProfiler's laps.
+
+    Attributes:
+        path: The trace file
+        events: Number of events handed to the writer
+        dropped: Number of events dropped because the writer fell behind
+    """
+
+    def __init__(self, path, batch=TRACE_BATCH, pending=TRACE_PENDING):
+        """Inits TraceWriter and starts its thread
+
+        Args:
+            path: File to write the trace to
+            batch: Events per batch handed to the writer thread
+            pending: Batches queued before new ones are dropped
+        """
+        self.path = path
+        self.events = 0
+        self.dropped = 0
+        self._size = batch
+        self._batch = []
+        self._queue = queue.Queue(pending)
+        self._start = time.perf_counter()
+        self._pid = os.getpid()
+        self._file = open(path, 'w')
+        self._thread = threading.Thread(target=self._run, name="trace writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _add(self, event):
+        """Queues an event, handing the batch over once it is full"""
+        self._batch.append(event)
+        if len(self._batch) >= self._size:
+            self.flush()
+
+    def complete(self, name, start, end, args=None):
+        """Records a duration event from start to end"""
+        self._add(("X", name, start, end, args))
+
+    def instant(self, name, args=None):
+        """Records an instant event now"""
+        self._add(("i", name, time.perf_counter(), None, args))
+
+    def counter(self, name, values):
+        """Records counter values now
+
+        Args:
+            name: Name of the counter track
+            values: Dict of series name to number
+        """
+        self._add(("C", name, time.perf_counter(), None, values))
+
+    def flush(self):
+        """Hands the current batch to the writer thread without waiting"""
+        batch = self._batch
+        if not batch:
+            return
+        self._batch = []
+        try:
+            self._queue.put_nowait(batch)
+            self.events += len(batch)
+        except queue.Full:
+            self.dropped += len(batch)
+
+    def close(self):
+        """Writes the remaining events and closes the file"""
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _encode(self, event):
+        """Returns one event as a trace-event dict"""
+        ph, name, start, end, args = event
+        record = {"name": name, "ph": ph, "pid": self._pid, "tid": 1,
+                  "ts": round((start - self._start) * 1e6, 1)}
+        if ph == "X":
+            record["dur"] = round((end - start) * 1e6, 1)
+        elif ph == "i":
+            record["s"] = "g"  # Draw across every track
+        if args:
+            record["args"] = args
+        return record
+
+    def _run(self):
+        """Writer thread: encodes batches until close"""
+        f = self._file
+        f.write('[\n')
+        f.write(json.dumps({"name": "process_name", "ph": "M",
+                            "pid": self._pid, "tid": 1,
+                            "args": {"name": "Meteor Storm"}}))
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                break
+            for event in batch:
+                f.write(',\n')
+                f.write(json.dumps(self._encode(event)))
+        f.write(',\n')
+        f.write(json.dumps({"name": "trace_stats", "ph": "M",
+                            "pid": self._pid, "tid": 1,
+                            "args": {"events": self.events,
+                                     "dropped": self.dropped}}))
+        f.write('\n]\n')
+        f.close()
@@ -0,0 +1,120 @@
+"""Zoom and fade transitions played back from baked frames
+
+A Transition describes how a surface is scaled and faded over time. The
+frames are baked with rotozoom the first time they are shown (or all at
+once with bake) and reused until the source surface changes, so playing
+an animation again costs one blit per frame.
+"""
+import pygame
+
+KEYFRAME_RATE = 60  # Baked frames per second of animation
+
+
+class Transition(object):
+    """A zoom and/or fade of a surface
+
+    Scale and alpha are interpolated linearly from their start to their
+    end value over duration.
+
+    Attributes:
+        duration: Length of the transition in milliseconds
+        scale: (start, end) zoom factor
+        alpha: (start, end) opacity from 0 to 255
+        frames: Number of baked keyframes
+    """
+
+    def __init__(self, duration, scale=(1.0, 1.0), alpha=(255, 255),
+                 rate=KEYFRAME_RATE):
+        """Inits Transition
+
+        Args:
+            duration: Length of the transition in milliseconds
+            scale: (start, end) zoom factor
+            alpha: (start, end) opacity from 0 to 255
+            rate: Keyframes baked per second of animation
+        """
+        self.duration = duration
+        self.scale = scale
+        self.alpha = alpha
+        self.frames = max(2, int(duration * rate / 1000.0) + 1)
+        self._source = None
+        self._copy = None
+        self._baked = []
+
+    def done(self, dt):
+        """Returns True once dt milliseconds cover the whole transition"""
+        return dt >= self.duration
+
+    def keyframe(self, dt):
+        """Returns the index of the keyframe shown dt milliseconds in"""
+        t = min(max(dt / float(self.duration), 0.0), 1.0)
+        return int(t * (self.frames - 1) + 0.5)
+
+    def values(self, dt):
+        """Returns (scale, alpha) of the keyframe shown dt milliseconds in"""
+        return self._values(self.keyframe(dt))
+
+    def _values(self, i):
+        """Returns (scale, alpha) of keyframe i"""
+        t = i / float(self.frames - 1)
+        scale = self.scale[0] + (self.scale[1] - self.scale[0]) * t
+        alpha = self.alpha[0] + (self.alpha[1] - self.alpha[0]) * t
+        return scale, int(alpha + 0.5)
+
+    def _reset(self, surface):
+        """Drops frames baked from another surface"""
+        self._source = surface
+        self._copy = None
+        self._baked = [None] * self.frames
+
+    def frame(self, surface, dt):
+        """Returns the frame of surface shown dt milliseconds in
+
+        The frame is baked on first use. It belongs to the transition and
+        must not be drawn on. Returns None for frames scaled to nothing.
+        """
+        if surface is not self._source:
+            self._reset(surface)
+        i = self.keyframe(dt)
+        baked = self._baked[i]
+        if baked is None:
+            scale, alpha = self._values(i)
+            if scale <= 0:
+                baked = False
+            else:
+                if scale == 1.0:
+                    # Unscaled frames share one copy
+                    if self._copy is None:
+                        self._copy = surface.copy()
+                    baked = self._copy
+                else:
+                    baked = pygame.transform.rotozoom(surface, 0, scale)
+            self._baked[i] = baked
+        if baked is False:
+            return None
+        # Alpha is set when shown as unscaled frames share a surface
+        baked.set_alpha(self._values(i)[1])
+        return baked
+
+    def bake(self, surface):
+        """Bakes every frame of surface ahead of time"""
+        for i in range(self.frames):
+            self.frame(surface, self.duration * i / float(self.frames - 1))
+
+    def draw(self, dest, surface, dt, **anchor):
+        """Draws the frame of surface shown dt milliseconds in
+
+        Args:
+            dest: Surface to draw on
+            surface: The surface being transitioned
+            dt: Milliseconds since the transition started
+            anchor: Rect attribute to place the frame by, e.g.
+                center=(187, 300)
+
+        Returns:
+            The Rect drawn to.
+        """
+        frame = self.frame(surface, dt)
+        if frame is None:
+            return pygame.Rect(0, 0, 0, 0)
+        return dest.blit(frame, frame.get_rect(**anchor))
@@ -0,0 +1,383 @@
+"""Batched Meteor Storm environments stepped in lockstep
+
+VecEnv holds K independent games in shared (K, capacity) arrays and
+advances all of them with one call to step, so training jobs pay the
+Python overhead once per tick instead of once per game. The rules are
+those of World.step, expressed over the batch:
+
+- an asteroid spawns whenever a game's newroid countdown reaches zero and
+  the countdown restarts at roidrate, which shortens as points grow;
+- a bolt hitting an asteroid scores 5 points; hits are swept over the
+  tick with collision.swept_times like World's, so bolts don't tunnel;
+- an asteroid touching the player costs a life;
+- a game ends when the player runs out of lives or an asteroid passes
+  HEIGHT.
+
+Asteroid-asteroid bounces are resolved for all pairs of a tick at once
+rather than one pair after another, so crowded games can drift from what
+World would do with the same spawns. Random draws come from one NumPy
+generator shared by the batch, so a batch is reproducible from its seed
+but individual games do not match World games with the same seed.
+"""
+import numpy as np
+
+from collision import swept_times
+from world import (TICK_MS, WIDTH, HEIGHT, PLAYER_W, PLAYER_H,
+                   PLAYER_CENTER, PLAYER_LIVES, PLAYER_MOVE_SPEED, FIRE_DELAY,
+                   BOLT_SPEED, BOLT_W, BOLT_H, ASTEROID_SIZE, ASTEROID_MAX_X,
+                   ASTEROID_MIN_Y, ASTEROID_MAX_Y, ASTEROID_EXPLODE_TIME,
+                   ROIDRATE, INPUT_LEFT, INPUT_RIGHT, INPUT_FIRE)
+
+# Fixed player geometry, matching Player.rect
+PLAYER_TOP = PLAYER_CENTER[1] - PLAYER_H // 2
+PLAYER_BOTTOM = PLAYER_TOP + PLAYER_H
+PLAYER_LEFT = PLAYER_CENTER[0] - PLAYER_W // 2
+
+# Raster cell values
+RASTER_PLAYER = 64
+RASTER_BOLT = 128
+RASTER_ASTEROID = 255
+
+
+class VecEnv(object):
+    """K Meteor Storm games stepped together
+
+    Asteroid and bolt fields are (num_envs, capacity) arrays. Each row is
+    kept packed, live entities first, so every tick works on the columns
+    up to the busiest game only.
+
+    Observations are either a feature array or, when raster is set, a
+    (num_envs, HEIGHT // raster, WIDTH // raster) uint8 image with
+    asteroids, bolts and the player painted in.
+
+    Attributes:
+        num_envs: Number of games
+        capacity: Asteroid slots per game; spawns beyond it are dropped
+        bolt_capacity: Bolt slots per game
+        raster: Downsampling factor of raster observations, or None
+        obs_asteroids: Asteroids described in feature observations
+        life_penalty: Reward subtracted for each life lost
+        points: Score of each game
+        lives: Lives left in each game
+        ticks: Ticks played in each game
+        final_points: Score each game ended on, updated when it resets
+        episodes: Number of games finished so far
+    """
+
+    def __init__(self, num_envs, seed=None, capacity=128, bolt_capacity=16,
+                 raster=None, obs_asteroids=16, life_penalty=0.0,
+                 base_roidrate=ROIDRATE, max_x=ASTEROID_MAX_X,
+                 min_y=ASTEROID_MIN_Y, max_y=ASTEROID_MAX_Y):
+        """Inits VecEnv and resets every game
+
+        Args:
+            num_envs: Number of games
+            seed: Seed of the batch's random number generator
+            capacity: Asteroid slots per game
+            bolt_capacity: Bolt slots per game
+            raster: Downsampling factor for raster observations, or None
+                for feature observations
+            obs_asteroids: Asteroids described in feature observations
+            life_penalty: Reward subtracted for each life lost
+            base_roidrate: Delay between asteroids at zero points
+            max_x: Starting maximum horizontal asteroid speed
+            min_y: Starting minimum vertical asteroid speed
+            max_y: Starting maximum vertical asteroid speed
+        """
+        self.num_envs = num_envs
+        self.capacity = capacity
+        self.bolt_capacity = bolt_capacity
+        self.raster = raster
+        self.obs_asteroids = obs_asteroids
+        self.life_penalty = life_penalty
+        self.random = np.random.default_rng(seed)
+        self._start = (base_roidrate, max_x, min_y, max_y)
+
+        k = num_envs
+        self.rx = np.zeros((k, capacity), np.int32)
+        self.ry = np.zeros((k, capacity), np.int32)
+        self.rvx = np.zeros((k, capacity), np.int32)
+        self.rvy = np.zeros((k, capacity), np.int32)
+        self.rexp = np.full((k, capacity), -1.0)
+        self.ralive = np.zeros((k, capacity), np.bool_)
+        self.bx = np.zeros((k, bolt_capacity), np.int32)
+        self.by = np.zeros((k, bolt_capacity), np.int32)
+        self.balive = np.zeros((k, bolt_capacity), np.bool_)
+
+        self.px = np.zeros(k, np.int32)
+        self.lives = np.zeros(k, np.int32)
+        self.can_fire = np.zeros(k, np.int32)
+        self.points = np.zeros(k, np.int64)
+        self.newroid = np.zeros(k)
+        self.base_roidrate = np.zeros(k)
+        self.roidrate = np.zeros(k)
+        self.max_x = np.zeros(k, np.int32)
+        self.min_y = np.zeros(k, np.int32)
+        self.max_y = np.zeros(k, np.int32)
+        self.time = np.zeros(k)
+        self.ticks = np.zeros(k, np.int64)
+        self.final_points = np.zeros(k, np.int64)
+        self.episodes = 0
+
+    def reset(self):
+        """Restarts every game and returns the observations"""
+        self._reset_envs(np.ones(self.num_envs, np.bool_))
+        return self.observe()
+
+    def _reset_envs(self, mask):
+        """Restarts the games selected by a boolean mask"""
+        base_roidrate, max_x, min_y, max_y = self._start
+        self.ralive[mask] = False
+        self.balive[mask] = False
+        self.rexp[mask] = -1.0
+        self.px[mask] = PLAYER_LEFT
+        self.lives[mask] = PLAYER_LIVES
+        self.can_fire[mask] = 0
+        self.points[mask] = 0
+        self.newroid[mask] = 0
+        self.base_roidrate[mask] = base_roidrate
+        self.roidrate[mask] = base_roidrate
+        self.max_x[mask] = max_x
+        self.min_y[mask] = min_y
+        self.max_y[mask] = max_y
+        self.time[mask] = 0
+        self.ticks[mask] = 0
+
+    def step(self, actions):
+        """Advances every game by one tick
+
+        Games that end on this tick are restarted before returning, so
+        their observation is the first of the next game. Their final
+        score is kept in final_points.
+
+        Args:
+            actions: Length num_envs array of INPUT_* bitmasks
+
+        Returns:
+            Tuple (obs, reward, done): the observations, the points
+            scored this tick (less life_penalty per life lost) and a
+            boolean array of games that ended.
+        """
+        actions = np.asarray(actions)
+        prev_points = self.points.copy()
+        prev_lives = self.lives.copy()
+
+        self._spawn()
+        self._move_player(actions)
+        self._collide()
+        done = self._move()
+
+        self.can_fire = np.maximum(self.can_fire - 1, 0)
+        done |= self.lives <= 0
+
+        # Decrease new asteroid timer
+        self.newroid = np.maximum(self.newroid - TICK_MS, 0)
+
+        # Progressive difficulty
+        points = self.points
+        early = points < 750
+        self.roidrate[early] = self.base_roidrate[early] - points[early]
+        scored = (points > 550) & (points != prev_points)
+        faster = scored & (points % 150 == 0)
+        self.max_x += faster
+        self.max_y += faster
+        self.min_y += scored & (points % 300 == 0)
+
+        self.time += TICK_MS
+        self.ticks += 1
+
+        reward = ((points - prev_points) -
+                  self.life_penalty * (prev_lives - self.lives)).astype(np.float32)
+
+        if done.any():
+            self.final_points[done] = points[done]
+            self.episodes += int(np.count_nonzero(done))
+            self._reset_envs(done)
+        return self.observe(), reward, done
+
+    def _spawn(self):
+        """Spawns an asteroid in every game whose countdown ran out"""
+        k = self.num_envs
+        rng = self.random
+        # Draw for every game so the generator advances the same each tick
+        col = rng.integers(0, WIDTH // ASTEROID_SIZE, k)
+        velx = rng.integers(-self.max_x, self.max_x + 1)
+        vely = rng.integers(self.min_y, self.max_y + 1)
+
+        count = self.ralive.sum(axis=1)
+        due = self.newroid == 0
+        rows = np.flatnonzero(due & (count < self.capacity))
+        slots = count[rows]
+        self.rx[rows, slots] = col[rows] * ASTEROID_SIZE
+        self.ry[rows, slots] = -ASTEROID_SIZE
+        self.rvx[rows, slots] = velx[rows]
+        self.rvy[rows, slots] = vely[rows]
+        self.rexp[rows, slots] = -1.0
+        self.ralive[rows, slots] = True
+        self.newroid[due] = self.roidrate[due]
+
+    def _move_player(self, actions):
+        """Applies movement and gun control"""
+        left = (actions & INPUT_LEFT) != 0
+        right = ~left & ((actions & INPUT_RIGHT) != 0)
+        self.px += PLAYER_MOVE_SPEED * (right.astype(np.int32) - left)
+        # Keep the player's center on screen
+        half = PLAYER_W // 2
+        np.clip(self.px, -half, WIDTH - half, out=self.px)
+
+        fire = ((actions & INPUT_FIRE) != 0) & (self.can_fire == 0)
+        count = self.balive.sum(axis=1)
+        rows = np.flatnonzero(fire & (count < self.bolt_capacity))
+        slots = count[rows]
+        self.bx[rows, slots] = self.px[rows] + half - 18
+        self.by[rows, slots] = PLAYER_TOP - 25
+        self.balive[rows, slots] = True
+        self.can_fire[fire] = FIRE_DELAY
+
+    def _collide(self):
+        """Resolves player, bolt and asteroid collisions"""
+        m = max(int(self.ralive.sum(axis=1).max()), 1)
+        rx = self.rx[:, :m]
+        ry = self.ry[:, :m]
+        alive = self.ralive[:, :m]
+        rexp = self.rexp[:, :m]
+        size = ASTEROID_SIZE
+
+        # Player-asteroid
+        px = self.px[:, None]
+        hit = (alive & (rexp < 0) & (ry + size > PLAYER_TOP) &
+               (ry < PLAYER_BOTTOM) & (rx + size > px) & (rx < px + PLAYER_W))
+        self.lives -= hit.sum(axis=1).astype(np.int32)
+        rexp[hit] = np.broadcast_to(self.time[:, None], hit.shape)[hit]
+        self.rvy[:, :m][hit] = 0
+
+        # Bolt-asteroid: bolts and asteroids are swept over the tick and
+        # each bolt is spent on the first asteroid it runs into
+        nb = max(int(self.balive.sum(axis=1).max()), 1)
+        times = swept_times(rx[:, :, None].astype(np.float64),
+                            ry[:, :, None].astype(np.float64), size, size,
+                            self.rvx[:, :m, None], self.rvy[:, :m, None],
+                            self.bx[:, None, :nb], self.by[:, None, :nb],
+                            BOLT_W, BOLT_H, 0, -BOLT_SPEED)
+        times[~(alive[:, :, None] & self.balive[:, None, :nb])] = np.inf
+        first = times.argmin(axis=1)
+        spent = np.isfinite(np.take_along_axis(times, first[:, None], 1)[:, 0])
+        if spent.any():
+            self.points += 5 * spent.sum(axis=1)
+            self.balive[:, :nb] &= ~spent
+            envs, bolts = np.nonzero(spent)
+            rexp[envs, first[envs, bolts]] = self.time[envs]
+
+        # Asteroid-asteroid: every overlapping pair bounces once
+        dx = rx[:, :, None] - rx[:, None, :]
+        dy = ry[:, :, None] - ry[:, None, :]
+        pairs = (alive[:, :, None] & alive[:, None, :] &
+                 (np.abs(dx) < size) & (np.abs(dy) < size))
+        pairs &= np.triu(np.ones((m, m), np.bool_), 1)
+        if pairs.any():
+            flips = pairs.sum(axis=2) + pairs.sum(axis=1)
+            self.rvx[:, :m][flips % 2 == 1] *= -1
+            push = np.where(pairs, np.trunc(dx / 2.0 + 1), 0).astype(np.int32)
+            rx += push.sum(axis=2) - push.sum(axis=1)
+
+    def _move(self):
+        """Moves bolts and asteroids and removes finished ones
+
+        Returns:
+            Boolean array of games where an asteroid passed HEIGHT.
+        """
+        self.by -= BOLT_SPEED
+        self.balive &= self.by + BOLT_H >= 0
+
+        self.rx += self.rvx
+        self.ry += self.rvy
+        left = self.rx < 0
+        self.rx[left] = 0
+        self.rvx[left] *= -1
+        right = self.rx + ASTEROID_SIZE > WIDTH
+        self.rx[right] = WIDTH - ASTEROID_SIZE
+        self.rvx[right] *= -1
+
+        passed = self.ralive & (self.ry > HEIGHT)
+        expired = ((self.rexp >= 0) &
+                   (self.time[:, None] - self.rexp > ASTEROID_EXPLODE_TIME))
+        self.ralive &= ~(passed | expired)
+        self._pack()
+        return passed.any(axis=1)
+
+    def _pack(self):
+        """Moves live entities to the front of every row, keeping order"""
+        order = np.argsort(~self.ralive, axis=1, kind="stable")
+        for name in ("rx", "ry", "rvx", "rvy", "rexp", "ralive"):
+            setattr(self, name, np.take_along_axis(getattr(self, name), order, 1))
+        order = np.argsort(~self.balive, axis=1, kind="stable")
+        for name in ("bx", "by", "balive"):
+            setattr(self, name, np.take_along_axis(getattr(self, name), order, 1))
+
+    def observe(self):
+        """Returns the observations of every game
+
+        Feature observations are float32 arrays of shape
+        (num_envs, 4 + 4 * obs_asteroids): the player's center x, lives,
+        fire cooldown and spawn countdown, then x, y, velx and vely of the
+        obs_asteroids lowest live asteroids (zeros when there are fewer),
+        all scaled to roughly [-1, 1].
+        """
+        if self.raster:
+            return self.render_raster()
+
+        k = self.num_envs
+        n = self.obs_asteroids
+        obs = np.zeros((k, 4 + 4 * n), np.float32)
+        obs[:, 0] = (self.px + PLAYER_W // 2) / float(WIDTH)
+        obs[:, 1] = self.lives / float(PLAYER_LIVES)
+        obs[:, 2] = self.can_fire / float(FIRE_DELAY)
+        obs[:, 3] = self.newroid / np.maximum(self.roidrate, 1)
+
+        # Lowest asteroids first
+        depth = np.where(self.ralive, self.ry, np.iinfo(np.int32).min)
+        order = np.argsort(-depth.astype(np.int64), axis=1)[:, :n]
+        live = np.take_along_axis(self.ralive, order, 1)
+        cols = min(n, self.capacity)
+        feats = obs[:, 4:4 + 4 * cols].reshape(k, cols, 4)
+        feats[:, :, 0] = np.take_along_axis(self.rx, order, 1) / float(WIDTH)
+        feats[:, :, 1] = np.take_along_axis(self.ry, order, 1) / float(HEIGHT)
+        feats[:, :, 2] = np.take_along_axis(self.rvx, order, 1) / 10.0
+        feats[:, :, 3] = np.take_along_axis(self.rvy, order, 1) / 10.0
+        feats[~live] = 0
+        return obs
+
+    def render_raster(self):
+        """Returns a downsampled uint8 image of every game
+
+        Shape is (num_envs, HEIGHT // raster, WIDTH // raster).
+        """
+        s = self.raster
+        k = self.num_envs
+        img = np.zeros((k, HEIGHT // s, WIDTH // s), np.uint8)
+        envs = np.arange(k)
+        self._paint(img, envs, self.px, np.full(k, PLAYER_TOP),
+                    PLAYER_W, PLAYER_H, RASTER_PLAYER)
+        envs, i = np.nonzero(self.balive)
+        self._paint(img, envs, self.bx[envs, i], self.by[envs, i],
+                    BOLT_W, BOLT_H, RASTER_BOLT)
+        envs, i = np.nonzero(self.ralive)
+        self._paint(img, envs, self.rx[envs, i], self.ry[envs, i],
+                    ASTEROID_SIZE, ASTEROID_SIZE, RASTER_ASTEROID)
+        return img
+
+    def _paint(self, img, envs, x, y, w, h, value):
+        """Fills the raster cells covered by boxes of one size"""
+        s = self.raster
+        rows, cols = img.shape[1:]
+        x0 = np.floor_divide(x, s)
+        y0 = np.floor_divide(y, s)
+        x1 = np.floor_divide(x + w - 1, s)
+        y1 = np.floor_divide(y + h - 1, s)
+        for dy in range(-(-h // s) + 1):
+            cy = y0 + dy
+            for dx in range(-(-w // s) + 1):
+                cx = x0 + dx
+                ok = (cy <= y1) & (cx <= x1) & (cy >= 0) & (cy < rows) & \
+                    (cx >= 0) & (cx < cols)
+                img[envs[ok], cy[ok], cx[ok]] = value
@@ -0,0 +1,276 @@
+"""Retained-mode UI widgets for the Meteor Storm menus
+
+Widgets render their surfaces once, when they are created or when their
+contents change, instead of every frame. Text goes through the shared
+textcache. A Panel composes its children onto cached surfaces, one per
+hover state of its buttons, and only recomposes when a child changed.
+"""
+import pygame
+
+import textcache
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+
+
+class Widget(object):
+    """A pre-rendered surface placed inside a Panel
+
+    Attributes:
+        image: Surface drawn for the widget
+        rect: Position and size of image in the parent's coordinates
+        visible: Flag indicating whether the parent draws the widget
+        dirty: Flag indicating the widget changed since it was composed
+    """
+
+    def __init__(self, image, **anchor):
+        """Inits Widget
+
+        Args:
+            image: Surface to draw
+            anchor: Rect attribute to place the widget by, e.g.
+                center=(150, 30)
+        """
+        self._image = image
+        self._anchor = anchor
+        self.rect = image.get_rect(**anchor)
+        self.visible = True
+        self.dirty = True
+
+    @property
+    def image(self):
+        """Surface drawn for the widget"""
+        return self._image
+
+    def set_image(self, image):
+        """Replaces the surface, keeping the widget's anchor"""
+        self._image = image
+        self.rect = image.get_rect(**self._anchor)
+        self.dirty = True
+
+    def place(self, **anchor):
+        """Moves the widget, e.g. place(center=(150, 50))"""
+        if anchor != self._anchor:
+            self._anchor = anchor
+            self.rect = self._image.get_rect(**anchor)
+            self.dirty = True
+
+    def show(self, visible=True):
+        """Shows or hides the widget"""
+        if visible != self.visible:
+            self.visible = visible
+            self.dirty = True
+
+
+class Label(Widget):
+    """A line of text, re-rendered only when the text changes
+
+    Attributes:
+        text: The text shown
+        font: Font the text is rendered with
+        color: Text color
+    """
+
+    def __init__(self, text, font, color=WHITE, **anchor):
+        """Inits Label"""
+        self.text = text
+        self.font = font
+        self.color = color
+        Widget.__init__(self, textcache.render(font, text, True, color),
+                        **anchor)
+
+    def set_text(self, text):
+        """Changes the text, rendering it if it differs"""
+        if text != self.text:
+            self.text = text
+            self.set_image(textcache.render(self.font, text, True, self.color))
+
+
+class Button(Widget):
+    """A clickable button with pre-rendered normal and hover surfaces
+
+    Attributes:
+        text: The button's caption
+        hover: Flag indicating the mouse is over the button
+    """
+
+    def __init__(self, text, font, size, border=1, inset=3, **anchor):
+        """Inits Button
+
+        Args:
+            text: Caption
+            font: Font of the caption
+            size: (width, height) of the button
+            border: Width of the inner border line
+            inset: Distance of the inner border from the edge
+            anchor: Rect attribute to place the button by
+        """
+        self.text = text
+        self.hover = False
+        self._normal = self._render(text, font, size, border, inset,
+                                    WHITE, (190, 190, 190), BLACK)
+        self._hover = self._render(text, font, size, border, inset,
+                                   BLACK, (65, 65, 65), WHITE)
+        Widget.__init__(self, self._normal, **anchor)
+
+    @staticmethod
+    def _render(text, font, size, border, inset, fill, line, color):
+        """Renders one look of the button"""
+        surf = pygame.Surface(size)
+        surf.fill(fill)
+        inner = surf.get_rect().inflate(-2 * inset, -2 * inset)
+        pygame.draw.rect(surf, line, inner, border)
+        lbl = textcache.render(font, text, True, color)
+        surf.blit(lbl, lbl.get_rect(center=surf.get_rect().center))
+        return surf.convert()
+
+    def set_hover(self, hover):
+        """Switches between the normal and hover surface
+
+        Not a content change: panels keep a composed surface per hover
+        state.
+        """
+        self.hover = hover
+        self._image = self._hover if hover else self._normal
+
+
+class Panel(Widget):
+    """A widget composed of other widgets
+
+    Composed surfaces are memoized on the hover state of the panel's
+    buttons, so moving the mouse between buttons only swaps cached
+    surfaces. The memo is dropped when a child's content changes, e.g.
+    a Label's text. Buttons, including those of nested panels, are
+    hit-tested against a table of their rects that is rebuilt only when
+    the content changes.
+
+    Attributes:
+        children: Widgets in drawing order
+        hovered: The Button under the mouse, or None
+        version: Incremented every time the content changes
+    """
+
+    def __init__(self, size, fill=(127, 127, 127), background=None,
+                 border=None, **anchor):
+        """Inits Panel
+
+        Args:
+            size: (width, height) of the panel
+            fill: Background color
+            background: Surface drawn over the fill, if any
+            border: (color, width) of a border around the panel, if any
+            anchor: Rect attribute to place the panel by
+        """
+        base = pygame.Surface(size)
+        base.fill(fill)
+        if background is not None:
+            base.blit(background, (0, 0))
+        if border is not None:
+            pygame.draw.rect(base, border[0], base.get_rect(), border[1])
+        self._base = base.convert()
+        self.children = []
+        self.hovered = None
+        self.version = 0
+        self._versions = ()  # Versions of nested panels when composed
+        self._composed = {}  # Hover flags of the buttons: surface
+        self._hit_rects = []
+        self._hit_buttons = []
+        Widget.__init__(self, self._base, **anchor)
+
+    def add(self, widget):
+        """Adds a child widget and returns it"""
+        self.children.append(widget)
+        self.dirty = True
+        return widget
+
+    def _refresh(self):
+        """Drops the memo and the hit table if the content changed"""
+        changed = self.dirty
+        versions = []
+        for child in self.children:
+            if isinstance(child, Panel):
+                child._refresh()
+                versions.append(child.version)
+            changed = changed or child.dirty
+        versions = tuple(versions)
+
+        if changed or versions != self._versions:
+            self.version += 1
+            self._versions = versions
+            self._composed.clear()
+            self._hit_buttons = []
+            self._hit_rects = []
+            self._collect_buttons(self._hit_buttons, self._hit_rects,
+                                  self.rect.topleft)
+            for child in self.children:
+                child.dirty = False
+            self.dirty = False
+
+    def _collect_buttons(self, buttons, rects, offset):
+        """Appends visible descendant buttons and their rects at offset"""
+        for child in self.children:
+            if not child.visible:
+                continue
+            if isinstance(child, Button):
+                buttons.append(child)
+                rects.append(child.rect.move(offset))
+            elif isinstance(child, Panel):
+                child._collect_buttons(
+                    buttons, rects,
+                    (offset[0] + child.rect.x, offset[1] + child.rect.y))
+
+    @property
+    def image(self):
+        """The composed surface for the current hover state"""
+        self._refresh()
+        key = tuple(b.hover for b in self._hit_buttons)
+        surf = self._composed.get(key)
+        if surf is None:
+            surf = self._base.copy()
+            for child in self.children:
+                if child.visible:
+                    surf.blit(child.image, child.rect)
+            self._composed[key] = surf
+        return surf
+
+    def button_at(self, pos):
+        """Returns the Button at a position in parent coordinates, or None"""
+        self._refresh()
+        i = pygame.Rect(pos, (1, 1)).collidelist(self._hit_rects)
+        return self._hit_buttons[i] if i != -1 else None
+
+    def button_rect(self, button):
+        """Returns a visible descendant button's Rect in parent
+        coordinates, or None"""
+        self._refresh()
+        for b, r in zip(self._hit_buttons, self._hit_rects):
+            if b is button:
+                return r
+        return None
+
+    def update(self, pos):
+        """Updates the hover state of the buttons
+
+        Args:
+            pos: Mouse position in the parent's coordinates (the screen
+                for a top-level panel), or None to clear the hover
+
+        Returns:
+            The Button under the mouse, or None.
+        """
+        hovered = self.button_at(pos) if pos is not None else None
+        if hovered is not self.hovered:
+            if self.hovered is not None:
+                self.hovered.set_hover(False)
+            if hovered is not None:
+                hovered.set_hover(True)
+            self.hovered = hovered
+        return hovered
+
+    def set_image(self, image):
+        """Not supported, a Panel's image is composed from its children"""
+        raise TypeError("A Panel's image is composed from its children")
+
+    def draw(self, surface):
+        """Blits the composed panel and returns the Rect drawn to"""
+        return surface.blit(self.image, self.rect)
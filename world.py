@@ -0,0 +1,497 @@
+"""Headless simulation core for Meteor Storm
+
+Holds the game world (player, asteroids, bolts, score and difficulty) and
+advances it one fixed tick at a time with World.step. Nothing in this
+module draws to a surface, so the same rules drive PlayingState and can
+run without a display for soak tests and difficulty tuning.
+
+A World owns its random number generator, so a seed and a stream of
+inputs always replay the same game. FixedStepper feeds a World from
+variable frame times and reports how far rendering should interpolate.
+"""
+import random
+import zlib
+
+import numpy as np
+import pygame
+
+from collision import SpatialHash, swept_hits
+from entities import Entity, EntityStore
+
+# Define Constants
+TICK_RATE = 30  # Simulation ticks per second
+TICK_MS = 1000.0 / TICK_RATE
+MAX_TICKS_PER_FRAME = 5  # Simulation falls behind real time beyond this
+WIDTH = 375
+HEIGHT = 600
+PLAYER_W = 75
+PLAYER_H = 35
+PLAYER_CENTER = (187, 550)  # Starting center of the player
+PLAYER_LIVES = 3
+PLAYER_MOVE_SPEED = 15
+FIRE_DELAY = 3  # Ticks between bolts
+BOLT_SPEED = 25
+BOLT_W = 10
+BOLT_H = 30
+ASTEROID_SIZE = 25
+ASTEROID_MAX_X = 5
+ASTEROID_MAX_Y = 8
+ASTEROID_MIN_Y = 2
+ASTEROID_EXPLODE_TIME = 50  # milliseconds an asteroid explosion lasts
+ROIDRATE = 1000  # Starting delay between asteroids in milliseconds
+NUM_ASTEROID_SPRITES = 4
+ASTEROID_CAPACITY = 2048  # Size of the asteroid pool
+BOLT_CAPACITY = 64  # Size of the bolt pool
+
+# Input bitmask passed to World.step
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_FIRE = 4
+INPUT_ESCAPE = 8
+
+
+class Player(object):
+    """Handles player movement and stores player variables
+
+    Attributes:
+        world: The attached World instance
+        rect: Stores the player's Rect for position and collisions
+        prev_x: Left coordinate at the start of the current tick
+        lives: Remaining lives
+        can_fire: Countdown until the player can fire a bolt again
+    """
+
+    def __init__(self, world):
+        """Inits the player"""
+        self.world = world
+        self.rect = pygame.Rect(0, 0, PLAYER_W, PLAYER_H)
+        self.reset()
+
+    def reset(self):
+        """Puts the player back at the start, in place"""
+        self.rect.center = PLAYER_CENTER
+        self.prev_x = self.rect.x
+        self.lives = PLAYER_LIVES
+        self.can_fire = 0
+
+    def move(self, x, y):
+        """Moves the player by specified offset
+
+        Checks for collisions with the edge of the window.
+
+        Args:
+            x: Offset in the x direction
+            y: Offset in the y direction
+        """
+        self.rect.move_ip(x, y)
+        if self.rect.centerx < 0:
+            self.rect.centerx = 0
+        if self.rect.centerx > WIDTH:
+            self.rect.centerx = WIDTH
+
+    def fire(self):
+        """Fires a new bolt"""
+        if self.can_fire == 0:
+            self.world.bolts.add(self.rect.centerx - 18, self.rect.top - 25,
+                                 0, -BOLT_SPEED)
+            self.can_fire = FIRE_DELAY
+
+    def update(self, ticks=1):
+        """Counts down the fire delay
+
+        Args:
+            ticks: Nominal ticks that passed
+        """
+        self.can_fire = max(self.can_fire - ticks, 0)
+
+
+def displacement(vel, scale):
+    """Returns how far velocities in pixels per tick move in scale ticks"""
+    if scale == 1:
+        return vel
+    return np.rint(vel * scale).astype(vel.dtype)
+
+
+class Bolt(Entity):
+    """View of one bolt in World.bolts"""
+    __slots__ = ()
+
+
+class Asteroid(Entity):
+    """View of one asteroid in World.roids"""
+    __slots__ = ()
+
+
+class World(object):
+    """The state of one game of Meteor Storm
+
+    Attributes:
+        seed: Seed of the world's random number generator
+        random: The world's random.Random instance
+        time: Milliseconds of simulated gameplay
+        ticks: Number of ticks simulated
+        points: Current score
+        player: The Player instance
+        bolts: EntityStore of bolts, a sequence of Bolt views
+        roids: EntityStore of asteroids, a sequence of Asteroid views
+        newroid: Countdown to new asteroid generation
+        roidrate: Frequency of new asteroid generation
+        base_roidrate: roidrate at zero points; it shortens as points grow
+        max_x: Maximum horizontal speed of new asteroids
+        min_y: Minimum vertical speed of new asteroids
+        max_y: Maximum vertical speed of new asteroids
+        spawned: Number of asteroids spawned
+        destroyed: Number of asteroids destroyed by bolts
+        game_over: Flag set by step when the game ended on that tick
+        profiler: Optional object whose lap(phase) is called as each
+            phase of step finishes, e.g. a profiler.FrameProfiler
+    """
+
+    def __init__(self, seed=None, asteroid_capacity=ASTEROID_CAPACITY,
+                 bolt_capacity=BOLT_CAPACITY, base_roidrate=ROIDRATE,
+                 max_x=ASTEROID_MAX_X, min_y=ASTEROID_MIN_Y,
+                 max_y=ASTEROID_MAX_Y):
+        """Inits World
+
+        Args:
+            seed: Integer seed for the world's random number generator.
+                A random seed is picked (and kept in seed) when None.
+            asteroid_capacity: Size of the asteroid pool
+            bolt_capacity: Size of the bolt pool
+            base_roidrate: Delay between asteroids at zero points
+            max_x: Starting maximum horizontal asteroid speed
+            min_y: Starting minimum vertical asteroid speed
+            max_y: Starting maximum vertical asteroid speed
+        """
+        self.bolts = EntityStore(BOLT_W, BOLT_H, bolt_capacity, Bolt)
+        self.roids = EntityStore(ASTEROID_SIZE, ASTEROID_SIZE,
+                                 asteroid_capacity, Asteroid)
+        self.base_roidrate = base_roidrate
+        self.profiler = None
+        self.player = Player(self)
+        self.random = random.Random()
+        self._speeds = (max_x, min_y, max_y)  # Starting asteroid speeds
+        self._grid = SpatialHash(ASTEROID_SIZE)
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """Starts a new game in this world
+
+        Everything a game changes is put back the way World() leaves it:
+        the pools are emptied, the player, score, timers and difficulty
+        start over and the random number generator is reseeded. The pool
+        arrays, the Player and the generator are reused in place, and
+        reset(seed) plays the same game as World(seed) with the same
+        arguments.
+
+        Args:
+            seed: Integer seed for the world's random number generator.
+                A random seed is picked (and kept in seed) when None.
+        """
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.random.seed(seed)
+        self.time = 0
+        self.ticks = 0
+        self.points = 0
+        for store in (self.bolts, self.roids):
+            store.clear()
+            store.reset_stats()
+        self.player.reset()
+        self.newroid = 0
+        self.roidrate = self.base_roidrate
+        self.max_x, self.min_y, self.max_y = self._speeds
+        self.spawned = 0
+        self.destroyed = 0
+        self.game_over = False
+
+        self._prev_points = 0  # score in previous step
+
+    def spawn_asteroid(self):
+        """Creates an asteroid at a random column above the screen
+
+        Returns:
+            The asteroid's index in roids, or -1 if the pool is full.
+        """
+        rng = self.random
+        i = self.roids.add(
+            rng.randint(0, WIDTH // ASTEROID_SIZE - 1) * ASTEROID_SIZE,
+            -ASTEROID_SIZE,
+            rng.randint(-self.max_x, self.max_x),
+            rng.randint(self.min_y, self.max_y),
+            rng.randint(0, NUM_ASTEROID_SPRITES - 1))
+        if i >= 0:
+            self.spawned += 1
+        return i
+
+    def step(self, inputs, dt=TICK_MS):
+        """Advances the world by one tick
+
+        Motion is in pixels per tick, so the game plays the same at any
+        frame rate as long as dt stays at the default TICK_MS. A coarser
+        dt scales every move to cover the longer tick, for runs that trade
+        accuracy for throughput; bolt hits are swept over the tick so they
+        are not skipped.
+
+        Args:
+            inputs: Bitmask of INPUT_* flags held during the tick
+            dt: Milliseconds simulated by the tick
+        """
+        scale = dt / TICK_MS
+        self.game_over = False
+        if self.points != self._prev_points:
+            self._prev_points = self.points
+
+        # Remember where everything started for render interpolation
+        self.roids.snapshot()
+        self.bolts.snapshot()
+        self.player.prev_x = self.player.rect.x
+
+        # Asteroid generation
+        if self.newroid == 0:
+            self.spawn_asteroid()
+            self.newroid = self.roidrate
+        prof = self.profiler
+        if prof:
+            prof.lap("spawn")
+
+        # Player movement
+        speed = int(round(PLAYER_MOVE_SPEED * scale))
+        if inputs & INPUT_LEFT:
+            self.player.move(-speed, 0)
+        elif inputs & INPUT_RIGHT:
+            self.player.move(speed, 0)
+        # Gun control
+        if inputs & INPUT_FIRE:
+            self.player.fire()
+        if prof:
+            prof.lap("input")
+
+        self.collide(scale)
+
+        # Update entities
+        self.move_bolts(scale)
+        self.move_asteroids(scale)
+        self.bolts.compact()
+        self.roids.compact()
+        self.player.update(max(int(round(scale)), 1))
+
+        if self.player.lives <= 0:
+            self.game_over = True
+
+        # Decrease new asteroid timer
+        self.newroid = max(self.newroid - dt, 0)
+
+        # Progressive difficulty
+        if self.points < 750:
+            # Minimum delay: base_roidrate - 750 milliseconds
+            self.roidrate = self.base_roidrate - self.points
+        if self.points > 550:
+            if self.points % 150 == 0 and self.points != self._prev_points:
+                self.max_x += 1
+                self.max_y += 1
+            if self.points % 300 == 0 and self.points != self._prev_points:
+                self.min_y += 1
+
+        self.time += dt
+        self.ticks += 1
+        if prof:
+            prof.lap("entities")
+
+    def move_bolts(self, scale=1):
+        """Moves every bolt and kills those that left the top of the screen
+
+        Args:
+            scale: Length of the tick in nominal ticks
+        """
+        bolts = self.bolts
+        n = bolts.count
+        y = bolts.y[:n]
+        y += displacement(bolts.vely[:n], scale)
+        bolts.alive[:n] &= y + bolts.h >= 0
+
+    def move_asteroids(self, scale=1):
+        """Moves every asteroid, bounces it off the side walls and kills
+        those that passed the bottom of the screen or finished exploding
+
+        Args:
+            scale: Length of the tick in nominal ticks
+        """
+        roids = self.roids
+        n = roids.count
+        x = roids.x[:n]
+        y = roids.y[:n]
+        velx = roids.velx[:n]
+        x += displacement(velx, scale)
+        y += displacement(roids.vely[:n], scale)
+
+        # Wall bounces
+        left = x < 0
+        x[left] = 0
+        velx[left] *= -1
+        right = x + roids.w > WIDTH
+        x[right] = WIDTH - roids.w
+        velx[right] *= -1
+
+        # An asteroid reaching the bottom ends the game
+        passed = y > HEIGHT
+        if passed.any():
+            self.game_over = True
+        explode = roids.explode[:n]
+        expired = (explode >= 0) & (self.time - explode > ASTEROID_EXPLODE_TIME)
+        roids.alive[:n] &= ~(passed | expired)
+
+    def collide(self, scale=1):
+        """Resolves player, bolt and asteroid collisions for this tick
+
+        Args:
+            scale: Length of the tick in nominal ticks
+        """
+        roids = self.roids
+        bolts = self.bolts
+        n = roids.count
+        x = roids.x[:n]
+        y = roids.y[:n]
+        w = roids.w
+        h = roids.h
+
+        # Player-Asteroid collision check
+        p = self.player.rect
+        hit = ((roids.explode[:n] < 0) & (y + h > p.top) & (y < p.bottom) &
+               (x + w > p.left) & (x < p.right))
+        if hit.any():
+            self.player.lives -= int(np.count_nonzero(hit))
+            roids.explode[:n][hit] = self.time
+            roids.vely[:n][hit] = 0
+        prof = self.profiler
+        if prof:
+            prof.lap("player_hits")
+
+        # Bolt-asteroid collision check
+        # Bolts and asteroids are swept over the tick and each bolt is
+        # spent on the first asteroid it runs into. Bolts are only marked
+        # dead here and compacted at the end of the tick.
+        nb = bolts.count
+        hits, _ = swept_hits(x, y, w, h,
+                             displacement(roids.velx[:n], scale),
+                             displacement(roids.vely[:n], scale),
+                             bolts.x[:nb], bolts.y[:nb], bolts.w, bolts.h,
+                             displacement(bolts.velx[:nb], scale),
+                             displacement(bolts.vely[:nb], scale))
+        spent = hits >= 0
+        if spent.any():
+            self.points += 5 * int(np.count_nonzero(spent))
+            bolts.alive[:nb] &= ~spent
+            hit = np.unique(hits[spent])
+            self.destroyed += int(np.count_nonzero(roids.explode[hit] < 0))
+            roids.explode[hit] = self.time
+        if prof:
+            prof.lap("bolt_hits")
+
+        # Asteroid-asteroid collision check, each candidate pair once
+        xs = x.tolist()
+        ys = y.tolist()
+        velx = roids.velx[:n].tolist()
+        grid = self._grid
+        grid.rebuild(xs, ys, w, h)
+        moved = False
+        for i, j in grid.pairs():
+            if abs(xs[i] - xs[j]) < w and abs(ys[i] - ys[j]) < h:
+                velx[i] = -velx[i]
+                velx[j] = -velx[j]
+
+                offset = int((xs[i] - xs[j]) / 2 + 1)
+                xs[i] += offset
+                xs[j] -= offset
+                moved = True
+        if moved:
+            roids.x[:n] = xs
+            roids.velx[:n] = velx
+        if prof:
+            prof.lap("roid_hits")
+
+    def checksum(self):
+        """Returns a CRC32 of the simulation state
+
+        Covers the tick count, score, player and every live asteroid and
+        bolt, so two worlds with equal checksums played the same game.
+        """
+        p = self.player
+        crc = zlib.crc32(repr((self.ticks, self.points, p.rect.x, p.lives,
+                               p.can_fire, self.newroid, self.roidrate,
+                               self.max_x, self.min_y, self.max_y)).encode())
+        for store in (self.roids, self.bolts):
+            n = store.count
+            for name in ("x", "y", "velx", "vely", "explode"):
+                crc = zlib.crc32(getattr(store, name)[:n].tobytes(), crc)
+        return crc
+
+    def pool_stats(self):
+        """Returns usage counters of the asteroid and bolt pools"""
+        return {"roids": self.roids.stats(), "bolts": self.bolts.stats()}
+
+    def clear_asteroids(self):
+        """Removes every asteroid from the world"""
+        self.roids.clear()
+
+
+class FixedStepper(object):
+    """Drives a World at a fixed timestep from variable frame times
+
+    Real elapsed time is collected in an accumulator and spent in whole
+    TICK_MS ticks, so outcomes depend only on the seed and the inputs,
+    never on the frame rate. alpha is how far the renderer should
+    interpolate between the last two ticks.
+
+    Attributes:
+        world: The driven World
+        time_scale: Simulated milliseconds per real millisecond
+        accumulator: Real time not yet spent on ticks, in simulated ms
+        max_ticks: Most ticks run for a single frame
+        recorder: Optional object whose record(inputs) is called after
+            every tick, e.g. a replay.ReplayRecorder
+    """
+
+    def __init__(self, world, time_scale=1.0, max_ticks=MAX_TICKS_PER_FRAME):
+        """Inits FixedStepper"""
+        self.world = world
+        self.time_scale = time_scale
+        self.accumulator = 0.0
+        self.max_ticks = max_ticks
+        self.recorder = None
+
+    @property
+    def alpha(self):
+        """Interpolation factor between the previous and current tick"""
+        return min(self.accumulator / TICK_MS, 1.0)
+
+    def advance(self, elapsed, inputs):
+        """Runs as many ticks as the elapsed time allows
+
+        Stops early on the tick that ends the game. When the simulation
+        falls more than max_ticks behind, the backlog is dropped instead
+        of being caught up.
+
+        Args:
+            elapsed: Real milliseconds since the previous frame
+            inputs: Bitmask of INPUT_* flags held during the frame
+
+        Returns:
+            The number of ticks run.
+        """
+        self.accumulator += elapsed * self.time_scale
+        ticks = 0
+        while self.accumulator >= TICK_MS:
+            if ticks == self.max_ticks:
+                self.accumulator = 0.0
+                break
+            self.world.step(inputs)
+            if self.recorder:
+                self.recorder.record(inputs)
+            self.accumulator -= TICK_MS
+            ticks += 1
+            if self.world.game_over:
+                self.accumulator = 0.0
+                break
+        return ticks